@@ -0,0 +1,148 @@
+"""Аутентификация по токену с кешем пользователей в памяти процесса.
+
+CachedTokenAuthentication запоминает ключ токена вместе со снимком
+пользователя в LRU-кеше процесса на TOKEN_CACHE_TTL секунд и, если
+включён TOKEN_CACHE_SHARED, в общем кеше Django на TOKEN_SHARED_CACHE_TTL
+секунд. Кеш используется только для безопасных методов (GET, HEAD,
+OPTIONS); изменяющие запросы получают пользователя из БД, как и обычная
+TokenAuthentication.
+
+Записи сбрасываются сигналами (api.signals) при удалении токена — выход
+через djoser, удаление в админке, удаление пользователя — и при
+сохранении пользователя: смене пароля, деактивации. Сигналы сбрасывают
+кеш своего процесса и общий кеш; в кешах других процессов запись
+доживает до конца TOKEN_CACHE_TTL.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram_backend import metrics
+
+SHARED_CACHE_KEY = 'auth_token:{}'
+
+
+class TokenCache:
+    """LRU-кеш «ключ токена → (пользователь, токен)» со сроком жизни."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.user_keys = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, user, token = entry
+            if expires <= time.monotonic():
+                self.pop(key)
+                return None
+            self.entries.move_to_end(key)
+            return user, token
+
+    def set(self, key, user, token):
+        with self.lock:
+            self.pop(key)
+            self.entries[key] = time.monotonic() + self.ttl, user, token
+            self.user_keys.setdefault(user.pk, set()).add(key)
+            while len(self.entries) > self.size:
+                self.pop(next(iter(self.entries)))
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1].pk
+        keys = self.user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.user_keys[user_id]
+
+    def invalidate(self, key):
+        with self.lock:
+            self.pop(key)
+
+    def invalidate_user(self, user_id):
+        with self.lock:
+            for key in list(self.user_keys.get(user_id, ())):
+                self.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.user_keys.clear()
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+def shared_cache_key(key):
+    # Сам ключ токена в общий кеш не попадает.
+    return SHARED_CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_token(key):
+    token_cache.invalidate(key)
+    if settings.TOKEN_CACHE_SHARED:
+        cache.delete(shared_cache_key(key))
+
+
+def invalidate_user(user_id):
+    token_cache.invalidate_user(user_id)
+    if settings.TOKEN_CACHE_SHARED:
+        cache.delete_many([
+            shared_cache_key(key) for key in Token.objects.filter(
+                user_id=user_id
+            ).values_list('key', flat=True)
+        ])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, которая для безопасных методов берёт
+    пользователя из кеша. Каждый запрос получает копию снимка, поэтому
+    изменения request.user в представлении в кеш не попадают.
+    """
+
+    cached = False
+
+    def authenticate(self, request):
+        self.cached = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not self.cached:
+            return super().authenticate_credentials(key)
+        entry = token_cache.get(key)
+        if entry is not None:
+            metrics.token_cache.inc(('hit',))
+        elif settings.TOKEN_CACHE_SHARED and (
+            entry := cache.get(shared_cache_key(key))
+        ) is not None:
+            metrics.token_cache.inc(('shared_hit',))
+            token_cache.set(key, *entry)
+        else:
+            metrics.token_cache.inc(('miss',))
+            entry = super().authenticate_credentials(key)
+            token_cache.set(key, *entry)
+            if settings.TOKEN_CACHE_SHARED:
+                cache.set(
+                    shared_cache_key(key), entry,
+                    settings.TOKEN_SHARED_CACHE_TTL
+                )
+        user, token = map(copy.copy, entry)
+        token.user = user
+        return user, token
@@ -0,0 +1,124 @@
+"""Условные GET-запросы (ETag / Last-Modified) и кеш ответов."""
+import hashlib
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from food.models import ContentVersion
+from .constants import RESPONSE_CACHE_TIMEOUT
+from .response_cache import record
+
+
+class ConditionalGetMixin:
+    """
+    Отвечает 304 Not Modified на list/retrieve, если данные не изменились
+    с момента, описанного ETag (If-None-Match) или Last-Modified
+    (If-Modified-Since) клиента. Состояние ответа вычисляется дешёвыми
+    запросами к версиям данных, без выборки объектов и сериализации.
+
+    Версии наборов данных conditional_versions берутся из ContentVersion;
+    подкласс может дополнить состояние в get_conditional_state.
+
+    Ответы анонимным пользователям на действия response_cache_actions
+    кешируются по тому же состоянию: изменение данных меняет версию, и
+    старые записи просто перестают запрашиваться.
+    """
+    conditional_actions = ('list', 'retrieve')
+    conditional_versions = ()
+    response_cache_actions = ()
+    # Параметры, порядок значений которых не влияет на ответ.
+    unordered_query_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_conditional_versions(self):
+        return self.conditional_versions
+
+    def get_query_state(self):
+        """
+        Параметры запроса без пустых значений, в каноническом порядке.
+        Параметр без значений остаётся в состоянии: само его наличие может
+        менять ответ (пустой cursor включает курсорную пагинацию).
+        """
+        state = []
+        for name, values in sorted(self.request.query_params.lists()):
+            values = [value for value in values if value]
+            if name in self.unordered_query_params:
+                values = sorted(set(values))
+            state.append((name, values))
+        return state
+
+    def get_conditional_state(self):
+        """
+        Части ETag и время последнего изменения (или None, если его нельзя
+        указать). Возвращает None, если условный ответ невозможен.
+        """
+        versions = ContentVersion.objects.get_versions(
+            *self.get_conditional_versions()
+        )
+        modified = [
+            updated_at for _, updated_at in versions.values() if updated_at
+        ]
+        return (
+            [self.get_query_state(), sorted(versions.items())],
+            max(modified) if modified else None,
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        state = None
+        if self.action in self.conditional_actions:
+            state = self.get_conditional_state()
+        if state is None:
+            return handler(request, *args, **kwargs)
+        parts, last_modified = state
+        etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            if (
+                self.action in self.response_cache_actions
+                and not request.user.is_authenticated
+            ):
+                response = self.cached_response(
+                    etag, handler, request, *args, **kwargs
+                )
+            else:
+                response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def cached_response(self, etag, handler, request, *args, **kwargs):
+        # Ссылки в ответе абсолютные, поэтому ключ зависит и от хоста.
+        cache_key = 'response:{}:{}:{}:{}'.format(
+            self.basename, self.action, request.build_absolute_uri('/'),
+            etag.strip('"')
+        )
+        data = cache.get(cache_key)
+        if data is not None:
+            record('hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        record('misses')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(cache_key, response.data, RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -1 +1,3 @@
 PAGINATION_LIMIT = 6
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+RESPONSE_CACHE_TIMEOUT = 10 * 60
@@ -1,14 +1,30 @@
 import django_filters
 from django.db.models import Exists, OuterRef
+from rest_framework.filters import BaseFilterBackend
 
-from food.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from food.models import Favorite, Ingredient, Recipe, ShoppingCart
+from food.search import search_recipes
+from food.tag_map import tag_map
+
+TAGS_MATCH_CHOICES = (('any', 'Любой из тегов'), ('all', 'Все теги'))
+
+
+def tag_choices():
+    return tag_map.choices()
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    """
+    Теги (?tags=) сопоставляются с id по словарю в памяти
+    (food.tag_map) и проверяются подзапросами EXISTS к таблице связей,
+    без JOIN и DISTINCT. ?tags_match=all оставляет рецепты со всеми
+    указанными тегами, по умолчанию (any) — с любым из них.
+    """
+    tags = django_filters.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_tags'
+    )
+    tags_match = django_filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES, method='filter_tags_match'
     )
     is_favorited = django_filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = django_filters.NumberFilter(
@@ -18,9 +34,24 @@ class RecipeFilter(django_filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited',
+        fields = ['tags', 'tags_match', 'author', 'is_favorited',
                   'is_in_shopping_cart']
 
+    def filter_tags(self, filtered_recipes, name, value):
+        tag_ids = tag_map.get_ids(value)
+        tagged = Recipe.tags.through.objects.filter(recipe_id=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            return filtered_recipes.filter(*(
+                Exists(tagged.filter(tag_id=tag_id)) for tag_id in tag_ids
+            ))
+        return filtered_recipes.filter(
+            Exists(tagged.filter(tag_id__in=tag_ids))
+        )
+
+    def filter_tags_match(self, filtered_recipes, name, value):
+        # Учитывается в filter_tags.
+        return filtered_recipes
+
     def filter_is_favorited(self, filtered_recipes, name, value):
         user = self.request.user
         if user.is_anonymous:
@@ -62,3 +93,26 @@ class IngredientFilter(django_filters.FilterSet):
     class Meta:
         model = Ingredient
         fields = ['name']
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск рецептов (?search=) по названию, описанию и
+    ингредиентам с сортировкой по релевантности (см. food.search).
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search_recipes(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Поиск по названию, описанию и ингредиентам.',
+            'schema': {'type': 'string'},
+        }]
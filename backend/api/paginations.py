@@ -1,8 +1,159 @@
-from rest_framework.pagination import PageNumberPagination
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+
+from food.feed import feed_page
+from foodgram_backend.paginator import EstimatedCountPaginator
 
 from .constants import PAGINATION_LIMIT
 
 
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация рецептов в порядке Recipe.Meta.ordering.
+
+    Курсор хранит ключ (created_at, id) крайней записи страницы, следующая
+    страница выбирается условием WHERE по этому ключу — без OFFSET и
+    COUNT(*), поэтому время ответа не зависит от глубины страницы, а
+    добавление новых рецептов не сдвигает уже выданные страницы.
+    """
+    page_size = PAGINATION_LIMIT
+    page_size_query_param = 'limit'
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor and self.parse_position(self.cursor.position)
+
+        results = self.get_results(
+            queryset, self.page_size + 1, position, reverse
+        )
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_results(self, queryset, limit, position, reverse):
+        """
+        До limit рецептов после ключа position от новых к старым, при
+        reverse — до ключа от старых к новым.
+        """
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position:
+            created_at, pk = position
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'created_at__{lookup}': created_at})
+                | Q(created_at=created_at, **{f'id__{lookup}': pk})
+            )
+        return list(queryset[:limit])
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.get_position(self.page[-1])
+        ))
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.get_position(self.page[0])
+        ))
+
+    @staticmethod
+    def get_position(recipe):
+        return f'{recipe.created_at.isoformat()}|{recipe.id}'
+
+    def parse_position(self, position):
+        try:
+            created_at, pk = position.rsplit('|', 1)
+            created_at, pk = parse_datetime(created_at), int(pk)
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """
+    Курсорная пагинация ленты подписок: ключи страницы выбирает
+    food.feed.feed_page по записям ленты, а queryset только догружает
+    рецепты страницы по id.
+    """
+
+    def get_results(self, queryset, limit, position, reverse):
+        ids = [pk for _, pk in feed_page(
+            self.request.user, limit, position, reverse
+        )]
+        recipes = queryset.in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
+
+
 class LimitPagination(PageNumberPagination):
+    """
+    Постраничная пагинация (page/limit).
+
+    Число записей в ответе (count) на больших выборках — оценка
+    (foodgram_backend.paginator).
+
+    Если задан cursor_pagination_class и в запросе есть параметр cursor
+    (в том числе пустой — для первой страницы), пагинация делегируется
+    курсорному классу — кроме запросов с непустыми cursor_ignored_params:
+    их порядок не совпадает с ключом курсора, и они выводятся по номерам
+    страниц.
+    """
     page_size = PAGINATION_LIMIT
     page_size_query_param = 'limit'
+    django_paginator_class = EstimatedCountPaginator
+    cursor_pagination_class = None
+    cursor_ignored_params = ()
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_pagination_class
+            and self.cursor_pagination_class.cursor_query_param
+            in request.query_params
+            and not any(
+                request.query_params.get(param, '').strip()
+                for param in self.cursor_ignored_params
+            )
+        ):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(LimitPagination):
+    cursor_pagination_class = RecipeCursorPagination
+    # Результаты поиска упорядочены по релевантности (RecipeSearchFilter).
+    cursor_ignored_params = ('search',)
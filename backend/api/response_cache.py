@@ -0,0 +1,41 @@
+"""Счётчики попаданий кеша ответов для анонимных пользователей.
+
+Счётчики хранятся в том же кеше, что и ответы, поэтому при общем кеше
+(CACHE_BACKEND) видны суммарно по всем процессам. Инвалидации считать
+отдельно не нужно: каждая из них — это увеличение версии данных в
+ContentVersion, поэтому их число — сумма версий.
+"""
+from django.core.cache import cache
+
+from food.models import ContentVersion
+
+STATS_CACHE_KEY = 'response_cache_stats:{}'
+EVENTS = ('hits', 'misses')
+# Наборы данных, от версий которых зависят закешированные ответы.
+CACHED_VERSIONS = ('recipe', 'tag', 'ingredient', 'user')
+
+
+def record(event):
+    key = STATS_CACHE_KEY.format(event)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Ключ вытеснили между add и incr.
+            cache.set(key, 1, None)
+
+
+def get_stats():
+    stats = {
+        event: cache.get(STATS_CACHE_KEY.format(event), 0)
+        for event in EVENTS
+    }
+    stats['invalidations'] = {
+        name: version for name, (version, _) in
+        ContentVersion.objects.get_versions(*CACHED_VERSIONS).items()
+    }
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([STATS_CACHE_KEY.format(event) for event in EVENTS])
@@ -3,12 +3,18 @@ from collections import Counter
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
 from food.constants import COOKING_TIME_MIN_VALUE, INGREDIENT_AMOUNT_MIN_VALUE
-from food.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                         ShoppingCart, Subscription, Tag)
+from food.models import (Ingredient, IngredientRecipe, Recipe,
+                         ShoppingCartTotal, Tag)
+from food.search import update_search_index
+from foodgram_backend.middleware import TimedSerializerMixin
+from .viewer import ViewerRelations
 
 
 User = get_user_model()
@@ -25,30 +31,105 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
-class BaseUserSerializerMixin(DjoserUserSerializer):
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Абсолютные ссылки на уменьшенные варианты картинки (food.images):
+    {размер: {формат: ссылка}}. Пока варианты не готовы — пустой объект.
+    """
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        return {
+            size: {
+                extension: (
+                    request.build_absolute_uri(default_storage.url(path))
+                    if request else default_storage.url(path)
+                )
+                for extension, path in formats.items()
+            }
+            for size, formats in (variants or {}).get('files', {}).items()
+        }
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    Список первичных ключей, объекты которого загружаются одним запросом
+    IN, а не по запросу на ключ. Ошибки — как у PrimaryKeyRelatedField
+    (many=True): первая ошибка списком из одного сообщения.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        pks = []
+        for value in data:
+            if isinstance(value, bool):
+                child.fail('incorrect_type', data_type=type(value).__name__)
+            try:
+                pks.append(int(value))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(value).__name__)
+        objects = child.get_queryset().in_bulk(pks)
+        for pk, value in zip(pks, data):
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=value)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который с many=True читает объекты пачкой."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class ViewerContextMixin:
+    """
+    Доступ к ViewerRelations из контекста сериализатора.
+
+    Объект хранится в общем контексте, поэтому вложенные сериализаторы
+    используют одни и те же загруженные связи. Если вьюсет не положил его
+    в контекст, он создаётся при первом обращении.
+    """
+
+    @property
+    def viewer(self):
+        context = self.context
+        if 'viewer' not in context:
+            request = context.get('request')
+            context['viewer'] = ViewerRelations(request and request.user)
+        return context['viewer']
+
+
+class BaseUserSerializerMixin(
+    TimedSerializerMixin, ViewerContextMixin, DjoserUserSerializer
+):
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField()
+    avatar_variants = ImageVariantsField()
 
     class Meta(DjoserUserSerializer.Meta):
         fields = (
             *DjoserUserSerializer.Meta.fields,
             'is_subscribed',
-            'avatar'
+            'avatar',
+            'avatar_variants'
         )
         read_only_fields = fields
 
     def get_is_subscribed(self, author):
-        return (
-            (request := self.context.get('request'))
-            and request.user.is_authenticated
-            and Subscription.objects.filter(
-                subscriber=request.user,
-                author=author
-            ).exists()
-        )
+        return self.viewer.is_subscribed(author)
 
 
-class AvatarSerializer(serializers.ModelSerializer):
+class AvatarSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     avatar = Base64ImageField()
 
     class Meta:
@@ -56,17 +137,20 @@ class AvatarSerializer(serializers.ModelSerializer):
         fields = ('avatar',)
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = fields
 
 
 class SubscribedUserSerializer(BaseUserSerializerMixin):
     """Сериализатор для subscriptions."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count')
 
     class Meta(BaseUserSerializerMixin.Meta):
         fields = (
@@ -77,28 +161,38 @@ class SubscribedUserSerializer(BaseUserSerializerMixin):
         read_only_fields = fields
 
     def get_recipes(self, obj):
+        """
+        Последние рецепты автора: из obj.recipe_previews, если вьюсет
+        загрузил их для всей страницы, иначе отдельным запросом.
+        """
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-
-        try:
-            recipes_limit = int(recipes_limit) if recipes_limit else 10**10
-        except ValueError:
-            recipes_limit = 10**10
-
-        recipes = obj.recipes.all()[:recipes_limit]
+        recipes = getattr(obj, 'recipe_previews', None)
+        if recipes is None:
+            recipes_limit = request.query_params.get('recipes_limit')
+
+            try:
+                recipes_limit = (
+                    int(recipes_limit) if recipes_limit else 10**10
+                )
+            except ValueError:
+                recipes_limit = 10**10
+
+            recipes = obj.recipes.all()[:recipes_limit]
         return RecipeShortSerializer(
             recipes, many=True, context={'request': request}
         ).data
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор модели Tag."""
     class Meta:
         model = Tag
         fields = '__all__'
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор модели Ingredient."""
     class Meta:
         model = Ingredient
@@ -120,7 +214,9 @@ class ReadIngredientRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class ReadRecipeSerializer(serializers.ModelSerializer):
+class ReadRecipeSerializer(
+    TimedSerializerMixin, ViewerContextMixin, serializers.ModelSerializer
+):
     """Сериализатор модели Recipe (для читающих запросов)."""
     ingredients = ReadIngredientRecipeSerializer(
         source='recipe_ingredients', many=True, read_only=True
@@ -129,6 +225,7 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     author = BaseUserSerializerMixin(read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -141,34 +238,21 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
 
     def get_is_favorited(self, recipe):
-        return self._check_user_relation(Favorite, recipe)
+        return self.viewer.is_favorited(recipe)
 
     def get_is_in_shopping_cart(self, recipe):
-        return self._check_user_relation(ShoppingCart, recipe)
-
-    def _check_user_relation(self, model, recipe):
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and model.objects.filter(
-                user=request.user,
-                recipe=recipe
-            ).exists()
-        )
+        return self.viewer.is_in_shopping_cart(recipe)
 
 
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
     """Serializer for creating/updating IngredientRecipe."""
-    id = serializers.PrimaryKeyRelatedField(
-        required=True,
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(required=True)
     amount = serializers.IntegerField(
         required=True,
         min_value=INGREDIENT_AMOUNT_MIN_VALUE
@@ -183,7 +267,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     """Сериализатор для записи рецепта."""
     image = Base64ImageField(required=True)
     ingredients = RecipeIngredientWriteSerializer(many=True, required=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
         required=True
@@ -220,6 +304,22 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         return data
 
+    @staticmethod
+    def resolve_ids(model, ids):
+        """
+        Загружает объекты model по ids одним запросом IN. Возвращает
+        {id: объект} и {позиция: ошибка} для неизвестных ids.
+        """
+        objects = model.objects.in_bulk(ids)
+        message = serializers.PrimaryKeyRelatedField.default_error_messages[
+            'does_not_exist'
+        ]
+        return objects, {
+            index: [message.format(pk_value=pk)]
+            for index, pk in enumerate(ids)
+            if pk not in objects
+        }
+
     def validate_tags(self, tags):
         return self.validate_list_unique(tags, 'Tags')
 
@@ -227,30 +327,84 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ingredient_ids = [ingredient_data['id']
                           for ingredient_data in ingredients]
         self.validate_list_unique(ingredient_ids, 'Ingredients')
-        return ingredients
+        found, errors = self.resolve_ids(Ingredient, ingredient_ids)
+        if errors:
+            raise serializers.ValidationError([
+                {'id': errors[index]} if index in errors else {}
+                for index in range(len(ingredients))
+            ])
+        return [
+            {**ingredient_data, 'id': found[ingredient_data['id']]}
+            for ingredient_data in ingredients
+        ]
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = super().create(validated_data)
         recipe.tags.set(tags)
         self.write_ingredients(recipe, ingredients_data)
+        update_search_index([recipe.pk])
 
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        IngredientRecipe.objects.filter(recipe=recipe).delete()
-        ingredients_data = self.validate_ingredients(
-            validated_data.pop('ingredients', [])
+        """
+        Применяет только разницу: новые ингредиенты вставляются, у
+        изменившихся обновляется количество, убранные удаляются; теги
+        меняет tags.set, который тоже добавляет и удаляет только разницу.
+        Всё выполняется в одной транзакции, так что читатели не видят
+        рецепт без ингредиентов.
+        """
+        ingredients_data = validated_data.pop('ingredients', [])
+        self.validate_list_unique(
+            [item['id'] for item in ingredients_data], 'Ingredients'
+        )
+        tags_data = self.validate_list_unique(
+            validated_data.pop('tags', []), 'Tags'
+        )
+        current = {
+            item.ingredient_id: item
+            for item in recipe.recipe_ingredients.select_for_update()
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()
+        }
+        new_amounts = {
+            item['id'].id: item['amount'] for item in ingredients_data
+        }
+        changed = []
+        for ingredient_id, item in current.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and amount != item.amount:
+                item.amount = amount
+                changed.append(item)
+        removed = [
+            item.pk for ingredient_id, item in current.items()
+            if ingredient_id not in new_amounts
+        ]
+        if removed:
+            IngredientRecipe.objects.filter(pk__in=removed).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        self.write_ingredients(recipe, [
+            item for item in ingredients_data
+            if item['id'].id not in current
+        ])
+        ShoppingCartTotal.objects.change_recipe(
+            recipe, old_amounts, new_amounts
         )
-        # if ingredients_data:
-        self.write_ingredients(recipe, ingredients_data)
-        tags_data = self.validate_tags(validated_data.pop('tags', []))
-        # if tags_data:
         recipe.tags.set(tags_data)
-        return super().update(recipe, validated_data)
+        recipe = super().update(recipe, validated_data)
+        update_search_index([recipe.pk])
+        return recipe
 
     def write_ingredients(self, recipe, ingredients_data):
+        if not ingredients_data:
+            return
         IngredientRecipe.objects.bulk_create(
             IngredientRecipe(
                 recipe=recipe,
@@ -264,7 +418,10 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return ReadRecipeSerializer(instance, context=self.context).data
 
 
-class RecipePreviewSerializer(serializers.ModelSerializer):
+class RecipePreviewSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -272,6 +429,7 @@ class RecipePreviewSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
         read_only_fields = fields
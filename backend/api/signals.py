@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Выход через djoser, удаление токена в админке или пользователя."""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, raw, update_fields,
+                           **kwargs):
+    """Смена пароля, деактивация и другие изменения пользователя."""
+    # Вход обновляет только last_login — снимки в кеше это не портит.
+    if created or raw or update_fields == frozenset(('last_login',)):
+        return
+    invalidate_user(instance.pk)
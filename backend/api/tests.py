@@ -0,0 +1,745 @@
+import csv
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache
+from api.exporters import EXPORTERS, PdfExporter, load_font
+from api.serializers import TagSerializer
+from food.feed import rebuild_timelines
+from food.models import (ContentVersion, Favorite, Ingredient,
+                         IngredientRecipe, Recipe, ShoppingCart,
+                         Subscription, Tag, User)
+from food.search import update_search_index
+from food.tag_map import tag_map
+from foodgram_backend.middleware import RequestMetrics, current_request
+from foodgram_backend.paginator import EstimatedCountPaginator
+
+MEDIA_ROOT = tempfile.mkdtemp()
+RECIPES = 60
+AUTHORS = 60
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+class QueryCountTests(TestCase):
+    """
+    Число запросов к БД не зависит от размера страницы: связанные данные
+    выбираются prefetch/select_related и пачками, а не по строке.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='x'
+        )
+        authors = User.objects.bulk_create(
+            User(username=f'author{number}',
+                 email=f'author{number}@example.com')
+            for number in range(AUTHORS)
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(5)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(50)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[number % AUTHORS],
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/test.jpg',
+            )
+            for number in range(RECIPES)
+        )
+        # Первый рецепт — с пятью ингредиентами, второй — с пятьюдесятью.
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe, count in zip(
+                recipes, (5, len(ingredients), *[3] * (RECIPES - 2))
+            )
+            for ingredient in ingredients[:count]
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=cls.viewer, recipe=recipe)
+                for recipe in recipes[::2]
+            )
+        Subscription.objects.bulk_create(
+            Subscription(subscriber=cls.viewer, author=author)
+            for author in authors
+        )
+        rebuild_timelines()
+        cls.small_recipe, cls.large_recipe = recipes[:2]
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.force_authenticate(self.viewer)
+
+    def count_queries(self, client, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assert_same_queries(self, client, small_url, large_url):
+        expected = self.count_queries(client, small_url)
+        cache.clear()
+        with self.assertNumQueries(expected):
+            response = client.get(large_url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_recipe_list(self):
+        for client in (self.anonymous, self.authenticated):
+            with self.subTest(authenticated=client is self.authenticated):
+                response = self.assert_same_queries(
+                    client, '/api/recipes/?limit=5', '/api/recipes/?limit=50'
+                )
+                self.assertEqual(len(response.data['results']), 50)
+
+    def test_recipe_detail(self):
+        for client in (self.anonymous, self.authenticated):
+            with self.subTest(authenticated=client is self.authenticated):
+                response = self.assert_same_queries(
+                    client,
+                    f'/api/recipes/{self.small_recipe.pk}/',
+                    f'/api/recipes/{self.large_recipe.pk}/',
+                )
+                self.assertEqual(len(response.data['ingredients']), 50)
+
+    def test_subscriptions(self):
+        # Подписки доступны только авторизованному пользователю.
+        response = self.assert_same_queries(
+            self.authenticated,
+            '/api/users/subscriptions/?limit=5&recipes_limit=3',
+            '/api/users/subscriptions/?limit=50&recipes_limit=3',
+        )
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_feed(self):
+        response = self.assert_same_queries(
+            self.authenticated,
+            '/api/recipes/feed/?limit=5',
+            '/api/recipes/feed/?limit=50',
+        )
+        first_page = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(first_page), 50)
+        response = self.authenticated.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), RECIPES - 50)
+        self.assertIsNone(response.data['next'])
+        response = self.authenticated.get(response.data['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            first_page
+        )
+
+
+class UserVersionTests(TestCase):
+    """Версия 'user' меняется только вместе с полями автора в ответах."""
+
+    def get_version(self):
+        return ContentVersion.objects.get_versions('user')['user'][0]
+
+    def save(self, user, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(**kwargs)
+
+    def test_bump(self):
+        user = User(username='cook', email='cook@example.com')
+        version = self.get_version()
+        self.save(user)
+        self.assertEqual(self.get_version(), version)
+        self.save(user, update_fields=['last_login'])
+        self.save(user)
+        self.assertEqual(self.get_version(), version)
+        user.first_name = 'Повар'
+        self.save(user)
+        self.assertEqual(self.get_version(), version + 1)
+
+
+class CounterFieldsTests(TestCase):
+    """Сохранение всего объекта не затирает счётчики, изменённые UPDATE."""
+
+    def test_save_keeps_counters(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='x'
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=10,
+            image='recipes/images/test.jpg',
+        )
+        author.refresh_from_db()
+        Favorite.objects.create(user=reader, recipe=recipe)
+        Subscription.objects.create(subscriber=reader, author=author)
+        recipe.name = 'Новое название'
+        recipe.save()
+        author.first_name = 'Автор'
+        author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(author.first_name, 'Автор')
+        self.assertEqual(
+            (author.recipes_count, author.followers_count), (1, 1)
+        )
+
+
+class EstimatedCountPaginatorTests(SimpleTestCase):
+    """При оценке числа записей следующая страница определяется по данным."""
+
+    def get_paginator(self, estimated_count):
+        paginator = EstimatedCountPaginator(list(range(25)), 10)
+        paginator.estimated = True
+        paginator.count = estimated_count
+        return paginator
+
+    def test_has_next(self):
+        for estimated_count in (10, 1000):
+            with self.subTest(estimated_count=estimated_count):
+                paginator = self.get_paginator(estimated_count)
+                self.assertTrue(paginator.page(2).has_next())
+                page = paginator.page(3)
+                self.assertEqual(list(page), [20, 21, 22, 23, 24])
+                self.assertFalse(page.has_next())
+
+
+class RecipePaginationTests(TestCase):
+    """Обход всех страниц списка рецептов без пропусков и повторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name='Борщ' if number % 5 == 0 else f'Рецепт {number}',
+                text='Щи да борщ' if number % 3 == 0 else 'Описание',
+                cooking_time=10,
+                image='recipes/images/test.jpg',
+            )
+            for number in range(23)
+        )
+        # Одинаковое время создания у соседних рецептов: порядок внутри
+        # такой группы задаёт id.
+        for recipe in recipes:
+            Recipe.objects.filter(pk=recipe.pk).update(
+                created_at=timezone.now() - timedelta(
+                    minutes=recipe.pk // 3
+                )
+            )
+        update_search_index(Recipe.objects.values('pk'))
+
+    def walk(self, **params):
+        ids, url = [], '/api/recipes/'
+        while url:
+            response = self.client.get(url, params)
+            params = None
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor(self):
+        ids = self.walk(cursor='', limit=4)
+        self.assertEqual(ids, list(Recipe.objects.order_by(
+            '-created_at', '-id'
+        ).values_list('pk', flat=True)))
+
+    def test_search_ignores_cursor(self):
+        ids = self.walk(search='борщ', cursor='', limit=2)
+        self.assertEqual(len(ids), len(set(ids)))
+        found = Recipe.objects.filter(
+            Q(name='Борщ') | Q(text__contains='борщ')
+        )
+        self.assertEqual(set(ids), set(found.values_list('pk', flat=True)))
+        # Совпадения в названии релевантнее совпадений в описании.
+        in_name = found.filter(name='Борщ').count()
+        self.assertTrue(all(
+            Recipe.objects.get(pk=pk).name == 'Борщ' for pk in ids[:in_name]
+        ))
+
+
+class TagFilterTests(TestCase):
+    """Фильтр рецептов по слагам тегов (?tags=, ?tags_match=)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        breakfast, lunch, dinner = Tag.objects.bulk_create(
+            Tag(name=slug, slug=slug)
+            for slug in ('breakfast', 'lunch', 'dinner')
+        )
+        cls.recipes = {}
+        for name, tags in (
+            ('breakfast', [breakfast]),
+            ('both', [breakfast, lunch]),
+            ('dinner', [dinner]),
+            ('untagged', []),
+        ):
+            recipe = Recipe.objects.create(
+                author=author, name=name, text='Описание', cooking_time=10,
+                image='recipes/images/test.jpg',
+            )
+            recipe.tags.set(tags)
+            cls.recipes[name] = recipe.pk
+
+    def setUp(self):
+        cache.clear()
+        tag_map.invalidate()
+
+    def get_names(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['name'] for recipe in response.data['results']}
+
+    def test_tags_match(self):
+        for query, names in (
+            ('tags=breakfast', {'breakfast', 'both'}),
+            ('tags=breakfast&tags=dinner', {'breakfast', 'both', 'dinner'}),
+            ('tags=breakfast&tags=lunch&tags_match=any',
+             {'breakfast', 'both'}),
+            ('tags=breakfast&tags=lunch&tags_match=all', {'both'}),
+            ('tags=lunch&tags=dinner&tags_match=all', set()),
+            ('', set(self.recipes)),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.get_names(query), names)
+
+    def test_unknown_slug(self):
+        for query in ('tags=brunch', 'tags=breakfast&tags=brunch',
+                      'tags=breakfast&tags_match=some'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?{query}')
+                self.assertEqual(response.status_code, 400)
+
+    def test_new_tag_visible_after_commit(self):
+        self.assertEqual(tag_map.get_ids(['brunch']), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(name='brunch', slug='brunch')
+            # До фиксации словарь не сбрасывается.
+            self.assertEqual(tag_map.get_ids(['brunch']), [])
+        self.assertEqual(tag_map.get_ids(['brunch']), [tag.pk])
+
+
+class ShoppingListExportTests(TestCase):
+    """Выгрузка списка покупок во всех форматах."""
+
+    LONG_NAME = 'очень длинное название ингредиента ' * 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='x'
+        )
+        flour, long_name = Ingredient.objects.bulk_create((
+            Ingredient(name='мука', measurement_unit='г'),
+            Ingredient(name=cls.LONG_NAME.strip(), measurement_unit='г'),
+        ))
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Пирог {number}', text='Описание',
+                cooking_time=10, image='recipes/images/test.jpg',
+            )
+            IngredientRecipe.objects.bulk_create((
+                IngredientRecipe(recipe=recipe, ingredient=flour, amount=100),
+                IngredientRecipe(
+                    recipe=recipe, ingredient=long_name, amount=1
+                ),
+            ))
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self, file_format):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': file_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'], EXPORTERS[file_format].content_type
+        )
+        return b''.join(response.streaming_content)
+
+    def test_formats(self):
+        for file_format in EXPORTERS:
+            with self.subTest(format=file_format):
+                self.assertTrue(self.download(file_format))
+        self.assertIn('1. Мука — 200(г)', self.download('txt').decode())
+        self.assertIn(
+            ['мука', '200', 'г'],
+            list(csv.reader(self.download('csv').decode().splitlines()))
+        )
+        self.assertEqual(
+            json.loads(self.download('json'))['ingredients'][0],
+            {'name': 'мука', 'measurement_unit': 'г', 'amount': 200}
+        )
+        self.assertTrue(self.download('pdf').startswith(b'%PDF'))
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': 'doc'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_pdf_wrap(self):
+        font = load_font(
+            settings.SHOPPING_LIST_PDF_FONT, PdfExporter.FONT_SIZE
+        )
+        width = PdfExporter.PAGE_SIZE[0] - 2 * PdfExporter.MARGIN
+        line = f'1. {self.LONG_NAME}{"б" * 200}'
+        rows = list(PdfExporter.wrap(line, font, width))
+        self.assertGreater(len(rows), 1)
+        self.assertTrue(all(font.getlength(row) <= width for row in rows))
+        self.assertEqual(''.join(rows).replace(' ', ''),
+                         line.replace(' ', ''))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeTagsValidationTests(TestCase):
+    """Ошибки поля tags — в формате PrimaryKeyRelatedField(many=True)."""
+
+    IMAGE = (
+        'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bK'
+        'AAAAA1BMVEUAAACnej3aAAAAAXRSTlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMA'
+        'AAAASUVORK5CYII='
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook', email='cook@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, tags):
+        return self.client.post('/api/recipes/', {
+            'name': 'Пирог',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': self.IMAGE,
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 100}],
+            'tags': tags,
+        }, format='json')
+
+    def test_errors(self):
+        missing = self.tag.pk + 1000
+        for tags, errors in (
+            ([missing], [
+                f'Недопустимый первичный ключ "{missing}" - объект не '
+                'существует.'
+            ]),
+            ([self.tag.pk, missing], [
+                f'Недопустимый первичный ключ "{missing}" - объект не '
+                'существует.'
+            ]),
+            ([self.tag.pk, self.tag.pk], [
+                'Tags не должны повторяться: {<Tag: Тег: Завтрак>: 2}'
+            ]),
+            (['x'], [
+                'Некорректный тип. Ожидалось значение первичного ключа, '
+                'получен str.'
+            ]),
+        ):
+            with self.subTest(tags=tags):
+                response = self.post(tags)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data['tags'], errors)
+
+    def test_valid(self):
+        response = self.post([self.tag.pk])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [tag['id'] for tag in response.data['tags']], [self.tag.pk]
+        )
+
+
+class ServerTimingTests(TestCase):
+    """Время сериализации без подмены BaseSerializer.data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.bulk_create(
+            Tag(name=f'tag{number}', slug=f'tag{number}')
+            for number in range(3)
+        )
+
+    def test_serializer_time(self):
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        try:
+            data = TagSerializer(Tag.objects.all(), many=True).data
+        finally:
+            current_request.reset(token)
+        self.assertEqual(len(data), 3)
+        self.assertGreater(request_metrics.serializer_time, 0)
+        self.assertEqual(request_metrics.serializer_depth, 0)
+
+    def test_header(self):
+        data = BaseSerializer.data
+        with override_settings(SERVER_TIMING=False):
+            response = self.client.get('/api/tags/')
+        self.assertNotIn('Server-Timing', response)
+        with override_settings(SERVER_TIMING=True):
+            response = self.client.get('/api/tags/')
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+        self.assertIs(BaseSerializer.data, data)
+
+
+class ConditionalGetTests(TestCase):
+    """ETag и If-None-Match у списка и страницы рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Омлет', text='Описание', cooking_time=10,
+            image='recipes/images/test.jpg',
+        )
+        cls.recipe.tags.add(cls.tag)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNotModified(self, url):
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        return etag
+
+    def assertChanged(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_recipe_edit(self):
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe.pk}/'):
+            with self.subTest(url=url):
+                etag = self.assertNotModified(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.recipe.name = f'{self.recipe.name}!'
+                    self.recipe.save()
+                self.assertChanged(url, etag)
+
+    def test_tag_edit(self):
+        for url in (
+            '/api/recipes/', f'/api/recipes/{self.recipe.pk}/', '/api/tags/'
+        ):
+            with self.subTest(url=url):
+                etag = self.assertNotModified(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.tag.name = f'{self.tag.name}!'
+                    self.tag.save()
+                self.assertChanged(url, etag)
+
+
+class ResponseCacheTests(TestCase):
+    """Кеш ответов анонимным пользователям и его сброс."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Омлет', text='Описание', cooking_time=10,
+            image='recipes/images/test.jpg',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_list(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_hit_and_invalidation(self):
+        self.assertEqual(self.get_list()['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_list()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertFalse(any(
+            'food_recipe' in query['sql'] for query in queries
+        ))
+        self.assertEqual(response.data['results'][0]['name'], 'Омлет')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Яичница'
+            self.recipe.save()
+        response = self.get_list()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['name'], 'Яичница')
+        self.assertEqual(self.get_list()['X-Cache'], 'HIT')
+
+
+class RecipeUpdateTests(TestCase):
+    """PATCH рецепта меняет только разницу в ингредиентах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='x'
+        )
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='x'
+        )
+        cls.tag = Tag.objects.create(name='Выпечка', slug='baking')
+        cls.flour, cls.sugar, cls.salt = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('мука', 'сахар', 'соль')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Пирог', text='Описание',
+            cooking_time=30, image='recipes/images/test.jpg',
+        )
+        cls.recipe.tags.add(cls.tag)
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(
+                recipe=cls.recipe, ingredient=cls.flour, amount=100
+            ),
+            IngredientRecipe(
+                recipe=cls.recipe, ingredient=cls.sugar, amount=50
+            ),
+        ])
+        update_search_index([cls.recipe.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.client.force_authenticate(self.author)
+
+    def search(self, query):
+        return [
+            recipe['id'] for recipe in self.client.get(
+                '/api/recipes/', {'search': query}
+            ).data['results']
+        ]
+
+    def test_patch_ingredients(self):
+        self.assertEqual(self.search('сахар'), [self.recipe.pk])
+        unchanged = IngredientRecipe.objects.get(ingredient=self.flour).pk
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'tags': [self.tag.pk],
+                'ingredients': [
+                    {'id': self.flour.pk, 'amount': 200},
+                    {'id': self.salt.pk, 'amount': 5},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {item['name']: item['amount']
+             for item in response.data['ingredients']},
+            {'мука': 200, 'соль': 5},
+        )
+        self.assertEqual(
+            dict(self.recipe.recipe_ingredients.values_list(
+                'ingredient__name', 'amount'
+            )),
+            {'мука': 200, 'соль': 5},
+        )
+        # Оставшийся ингредиент обновлён на месте, а не пересоздан.
+        self.assertTrue(
+            IngredientRecipe.objects.filter(pk=unchanged, amount=200).exists()
+        )
+        self.assertEqual(
+            {
+                name: (amount, recipes_count)
+                for name, amount, recipes_count in
+                self.buyer.shopping_cart_totals.values_list(
+                    'ingredient__name', 'amount', 'recipes_count'
+                )
+            },
+            {'мука': (200, 1), 'соль': (5, 1)},
+        )
+        self.assertEqual(self.search('сахар'), [])
+        self.assertEqual(self.search('соль'), [self.recipe.pk])
+
+
+class TokenCacheTests(TestCase):
+    """Сброс кеша токенов процесса при выходе и деактивации."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='secret-1'
+        )
+        response = self.client.post('/api/auth/token/login/', {
+            'email': 'user@example.com', 'password': 'secret-1'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.auth = {
+            'HTTP_AUTHORIZATION': f'Token {response.data["auth_token"]}'
+        }
+        # Второй запрос берёт пользователя из кеша процесса.
+        for _ in range(2):
+            self.assertEqual(self.get_me().status_code, 200)
+        self.assertEqual(len(token_cache.entries), 1)
+
+    def get_me(self):
+        return self.client.get('/api/users/me/', **self.auth)
+
+    def test_logout(self):
+        response = self.client.post('/api/auth/token/logout/', **self.auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(len(token_cache.entries), 0)
+        self.assertEqual(self.get_me().status_code, 401)
+
+    def test_deactivation(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(len(token_cache.entries), 0)
+        self.assertEqual(self.get_me().status_code, 401)
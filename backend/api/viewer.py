@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+
+from food.models import Favorite, Recipe, ShoppingCart, Subscription
+
+User = get_user_model()
+
+
+class ViewerRelations:
+    """
+    Связи текущего пользователя с объектами, которые видны на странице.
+
+    Идентификаторы избранных рецептов, рецептов в корзине и авторов,
+    на которых подписан пользователь, загружаются пачкой (по одному
+    запросу на вид связи), а флаги is_favorited, is_in_shopping_cart и
+    is_subscribed становятся проверкой вхождения в множество. Объекты,
+    которые не были загружены заранее, догружаются при первом обращении.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.loaded_recipe_ids = set()
+        self.loaded_author_ids = set()
+        self.favorited = set()
+        self.in_shopping_cart = set()
+        self.subscribed = set()
+
+    @property
+    def is_authenticated(self):
+        return bool(self.user and self.user.is_authenticated)
+
+    def preload(self, objects):
+        """Загружает связи для рецептов и пользователей из objects."""
+        if isinstance(objects, (Recipe, User)):
+            objects = (objects,)
+        recipe_ids, author_ids = set(), set()
+        for obj in objects:
+            if isinstance(obj, Recipe):
+                recipe_ids.add(obj.pk)
+                author_ids.add(obj.author_id)
+            elif isinstance(obj, User):
+                author_ids.add(obj.pk)
+        self.load_recipes(recipe_ids)
+        self.load_authors(author_ids)
+
+    def load_recipes(self, recipe_ids):
+        recipe_ids = set(recipe_ids) - self.loaded_recipe_ids
+        if not recipe_ids or not self.is_authenticated:
+            return
+        self.loaded_recipe_ids |= recipe_ids
+        for model, loaded in (
+            (Favorite, self.favorited),
+            (ShoppingCart, self.in_shopping_cart),
+        ):
+            loaded.update(model.objects.filter(
+                user=self.user, recipe_id__in=recipe_ids
+            ).values_list('recipe_id', flat=True))
+
+    def load_authors(self, author_ids):
+        author_ids = set(author_ids) - self.loaded_author_ids
+        if not author_ids or not self.is_authenticated:
+            return
+        self.loaded_author_ids |= author_ids
+        self.subscribed.update(Subscription.objects.filter(
+            subscriber=self.user, author_id__in=author_ids
+        ).values_list('author_id', flat=True))
+
+    def is_favorited(self, recipe):
+        self.load_recipes((recipe.pk,))
+        return recipe.pk in self.favorited
+
+    def is_in_shopping_cart(self, recipe):
+        self.load_recipes((recipe.pk,))
+        return recipe.pk in self.in_shopping_cart
+
+    def is_subscribed(self, author):
+        self.load_authors((author.pk,))
+        return author.pk in self.subscribed
@@ -1,32 +1,67 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
-from rest_framework import filters, status, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from food.models import (Favorite, Ingredient, Recipe, ShoppingCart,
-                         Subscription, Tag)
-from .filters import IngredientFilter, RecipeFilter
-from .paginations import LimitPagination
+from food.images import schedule_delete_files
+from food.ingredient_index import ingredient_index
+from food.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                         ShoppingCart, Subscription, Tag)
+from .conditional import ConditionalGetMixin
+from .constants import SHOPPING_LIST_CACHE_TIMEOUT
+from .exporters import EXPORTERS
+from .filters import RecipeFilter, RecipeSearchFilter
+from .negotiation import IgnoreFormatContentNegotiation
+from .paginations import (FeedCursorPagination, LimitPagination,
+                          RecipePagination)
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (AvatarSerializer, BaseUserSerializerMixin,
                           IngredientSerializer, ReadRecipeSerializer,
                           RecipePreviewSerializer, RecipeWriteSerializer,
                           SubscribedUserSerializer, TagSerializer)
+from .viewer import ViewerRelations
 
 User = get_user_model()
 
 
-class UserViewSet(DjoserUserViewSet):
+class ViewerContextMixin:
+    """
+    Кладёт в контекст сериализатора ViewerRelations текущего пользователя
+    и заранее загружает связи для всех объектов сериализуемой страницы.
+    """
+
+    def get_viewer(self):
+        if not hasattr(self, '_viewer'):
+            self._viewer = ViewerRelations(self.request.user)
+        return self._viewer
+
+    def get_serializer_context(self):
+        return {
+            **super().get_serializer_context(),
+            'viewer': self.get_viewer(),
+        }
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if args and args[0] is not None:
+            serializer.context['viewer'].preload(args[0])
+        return serializer
+
+
+class UserViewSet(ViewerContextMixin, DjoserUserViewSet):
     """Кастомный вьюсет пользователя с обработкой подписок."""
     serializer_class = BaseUserSerializerMixin
     pagination_class = LimitPagination
@@ -40,6 +75,11 @@ class UserViewSet(DjoserUserViewSet):
         """Получение информации о текущем пользователе."""
         return super().me(request)
 
+    def get_instance(self):
+        # request.user может быть снимком из кеша токенов, а аватар и его
+        # варианты обновляются и фоновыми задачами.
+        return User.objects.get(pk=self.request.user.pk)
+
     @action(
         detail=False,
         methods=['put', 'delete'],
@@ -50,15 +90,17 @@ class UserViewSet(DjoserUserViewSet):
     def avatar(self, request):
         """Обновление или удаление аватара пользователя."""
         user = request.user
+        # Старый файл удаляется фоновой задачей после сохранения.
+        old_avatar = user.avatar.name
 
         if request.method == 'PUT':
             serializer = self.get_serializer(
                 user, data=request.data, partial=False
             )
             serializer.is_valid(raise_exception=True)
-            if user.avatar:
-                user.avatar.delete(save=False)
             instance = serializer.save()
+            if old_avatar:
+                schedule_delete_files([old_avatar])
             avatar_url = instance.avatar.url
             full_avatar_url = request.build_absolute_uri(avatar_url)
 
@@ -67,24 +109,23 @@ class UserViewSet(DjoserUserViewSet):
                 status=status.HTTP_200_OK
             )
 
-        if user.avatar:
-            user.avatar.delete(save=True)
-            user.save()
+        if old_avatar:
+            user.avatar = None
+            user.save(update_fields=['avatar'])
+            schedule_delete_files([old_avatar])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=True,
         methods=['post', 'delete'],
         url_path='subscribe',
+        serializer_class=SubscribedUserSerializer,
         permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, id=None):
         """Подписка/отписка от пользователя."""
         author = get_object_or_404(User, id=id)
         user = request.user
-        serializer = SubscribedUserSerializer(
-            author, context={'request': request}
-        )
         subscription = Subscription.objects.filter(
             subscriber=user, author=author
         ).first()
@@ -99,8 +140,9 @@ class UserViewSet(DjoserUserViewSet):
             Subscription.objects.create(
                 subscriber=user, author=author
             )
+            self.attach_recipe_previews([author])
             return Response(
-                serializer.data,
+                self.get_serializer(author).data,
                 status=status.HTTP_201_CREATED
             )
         if not subscription:
@@ -114,6 +156,7 @@ class UserViewSet(DjoserUserViewSet):
     @action(
         detail=False,
         methods=['get'],
+        serializer_class=SubscribedUserSerializer,
         permission_classes=(IsAuthenticated,)
     )
     def subscriptions(self, request):
@@ -121,46 +164,164 @@ class UserViewSet(DjoserUserViewSet):
         subscribed_authors = User.objects.filter(
             authors__subscriber=request.user)
         page = self.paginate_queryset(subscribed_authors)
-        serializer = SubscribedUserSerializer(
-            page,
-            many=True,
-            context={'request': request}
-        )
+        self.attach_recipe_previews(page)
+        serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
 
-
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    def attach_recipe_previews(self, authors):
+        """
+        Кладёт в author.recipe_previews последние ?recipes_limit= рецептов
+        каждого автора страницы. Рецепты всех авторов выбираются одним
+        запросом: ROW_NUMBER() нумерует рецепты внутри автора от новых к
+        старым, и остаются первые recipes_limit.
+        """
+        recipes = Recipe.objects.filter(author__in=authors)
+        limit = self.get_recipes_limit()
+        if limit is not None:
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('created_at').desc(), F('id').desc()),
+            )).filter(row_number__lte=limit)
+        previews = {author.pk: [] for author in authors}
+        for recipe in recipes.order_by('author_id', '-created_at', '-id'):
+            previews[recipe.author_id].append(recipe)
+        for author in authors:
+            author.recipe_previews = previews[author.pk]
+
+    def get_recipes_limit(self):
+        try:
+            limit = int(self.request.query_params.get('recipes_limit', ''))
+        except ValueError:
+            return None
+        return max(limit, 0)
+
+
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    conditional_versions = ('tag',)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ConditionalGetMixin, viewsets.ReadOnlyModelViewSet
+):
+    conditional_versions = ('ingredient',)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.search, request)
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    pagination_class = LimitPagination
+    def search(self, request):
+        """
+        Список ингредиентов из индекса в памяти (food.ingredient_index):
+        ?name= ищет по началу названия или слова в нём, при опечатке —
+        по похожим названиям.
+        """
+        name = request.query_params.get('name', '')
+        return Response(self.get_serializer(
+            ingredient_index.search(name), many=True
+        ).data)
+
+
+class RecipeViewSet(
+    ConditionalGetMixin, ViewerContextMixin, viewsets.ModelViewSet
+):
+    conditional_versions = ('tag', 'ingredient', 'user')
+    response_cache_actions = ('list', 'retrieve')
+    unordered_query_params = ('tags',)
+    pagination_class = RecipePagination
     queryset = Recipe.objects.all()
     serializer_class = ReadRecipeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, RecipeSearchFilter]
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.action not in ['list', 'retrieve', 'feed']:
+            return Recipe.objects.all()
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+    def get_conditional_versions(self):
+        if self.action == 'list':
+            return ('recipe', *self.conditional_versions)
+        return self.conditional_versions
+
+    def get_conditional_state(self):
+        """
+        Список зависит от всех рецептов и обрабатывается условно только
+        для анонимных пользователей. Отдельный рецепт меняется вместе с
+        updated_at, тегами, ингредиентами и автором; для авторизованного
+        пользователя ответ зависит ещё и от его флагов is_favorited,
+        is_in_shopping_cart и is_subscribed. Они не отражаются во времени
+        изменения, поэтому Last-Modified таким пользователям не отдаётся —
+        только ETag.
+        """
+        if self.action == 'list':
+            if self.request.user.is_authenticated:
+                return None
+            return super().get_conditional_state()
+        try:
+            recipe = Recipe.objects.values('updated_at', 'author_id').get(
+                pk=self.kwargs['pk']
+            )
+        except (Recipe.DoesNotExist, ValueError, DjangoValidationError):
+            return None
+        parts, last_modified = super().get_conditional_state()
+        parts.append(recipe['updated_at'].isoformat())
+        last_modified = max(
+            filter(None, (last_modified, recipe['updated_at']))
+        )
+        viewer = self.get_viewer()
+        if viewer.is_authenticated:
+            recipe_id = int(self.kwargs['pk'])
+            viewer.load_recipes((recipe_id,))
+            viewer.load_authors((recipe['author_id'],))
+            parts.append((
+                self.request.user.pk,
+                recipe_id in viewer.favorited,
+                recipe_id in viewer.in_shopping_cart,
+                recipe['author_id'] in viewer.subscribed,
+            ))
+            last_modified = None
+        return parts, last_modified
+
     def get_serializer_class(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'feed']:
             return ReadRecipeSerializer
         return RecipeWriteSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        pagination_class=FeedCursorPagination,
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """
+        Лента подписок: новые рецепты авторов, на которых подписан
+        пользователь (food.feed), с постраничным выводом по курсору.
+        """
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         url_path='get-link',
@@ -168,39 +329,70 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_link(self, request, pk=None):
         """Создание короткой ссылки."""
+        recipe = get_object_or_404(Recipe.objects.only('short_code'), pk=pk)
         return Response({'short-link': request.build_absolute_uri(
-            f'/s/{pk}/')}, status=status.HTTP_200_OK)
+            f'/s/{recipe.short_code}/')}, status=status.HTTP_200_OK)
 
     @action(
         detail=False,
         methods=['get'],
         url_path='download_shopping_cart',
+        content_negotiation_class=IgnoreFormatContentNegotiation,
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        user = request.user
+        """
+        Выгрузка списка покупок в формате ?format= (txt, csv, json, pdf).
 
-        recipes = user.shoppingcarts.select_related(
-            'recipe').all().distinct()
-
-        ingredients_with_sum = recipes.values(
-            'recipe__recipe_ingredients__ingredient__name',
-            'recipe__recipe_ingredients__ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('recipe__recipe_ingredients__amount')
-        ).order_by('recipe__recipe_ingredients__ingredient__name')
-
-        content = render_to_string('shopping_list.txt', {
-            'ingredients': ingredients_with_sum,
-            'recipes': recipes,
-            'date': timezone.now().date()
-        })
-
-        return FileResponse(
-            content,
-            as_attachment=True,
-            filename='shopping_list.txt'
+        Файл отдаётся потоком. Готовый результат кешируется по версии
+        корзины пользователя, поэтому повторная выгрузка неизменной
+        корзины обходится одним запросом версии без рендеринга.
+        """
+        file_format = request.query_params.get('format', 'txt')
+        if file_format not in EXPORTERS:
+            raise ValidationError({'format': (
+                f'Неизвестный формат {file_format}. '
+                f'Доступные форматы: {", ".join(EXPORTERS)}.'
+            )})
+        exporter_class = EXPORTERS[file_format]
+        user = request.user
+        # Версия корзины меняется через update(), поэтому в снимке
+        # пользователя из кеша токенов она может быть устаревшей.
+        version = User.objects.filter(pk=user.pk).values_list(
+            'shopping_cart_version', flat=True
+        ).get()
+        date = timezone.localdate()
+        cache_key = (
+            f'shopping_list:{user.pk}:{version}:'
+            f'{file_format}:{date.isoformat()}'
+        )
+        content = cache.get(cache_key)
+        if content is None:
+            content = self.cache_chunks(cache_key, exporter_class(
+                ingredients=user.shopping_cart_totals.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name').iterator(),
+                recipes=Recipe.objects.filter(
+                    shoppingcarts__user=user
+                ).select_related('author').order_by('name').iterator(),
+                date=date,
+            ).render())
+        response = StreamingHttpResponse(
+            content, content_type=exporter_class.content_type
+        )
+        response['Content-Disposition'] = content_disposition_header(
+            True, f'shopping_list.{exporter_class.extension}'
         )
+        return response
+
+    @staticmethod
+    def cache_chunks(cache_key, chunks):
+        """Отдаёт части файла и кеширует их, когда файл отдан целиком."""
+        rendered = []
+        for chunk in chunks:
+            rendered.append(chunk)
+            yield chunk
+        cache.set(cache_key, rendered, SHOPPING_LIST_CACHE_TIMEOUT)
 
     def manage_relation(self, request, pk, model):
         """
@@ -1,13 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.db.models import Count
+from django.db.models import Count, F, Prefetch
 from django.utils.safestring import mark_safe
 from foodgram_backend.admin import admin_site
+from foodgram_backend.paginator import EstimatedCountPaginator
 
-from .filter import (HasFollowersFilter, HasRecipesFilter,
-                     HasSubscriptionsFilter)
+from .filter import (AuthorFilter, HasFollowersFilter, HasRecipesFilter,
+                     HasSubscriptionsFilter, SubscriberFilter, UserFilter)
 from .models import (Favorite, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingCart, Subscription, Tag, User)
+                     ShoppingCart, ShoppingCartTotal, Subscription, Tag,
+                     User)
+from .search import update_search_index
 
 
 @admin.register(User, site=admin_site)
@@ -33,12 +36,12 @@ class CastomUserAdmin(BaseUserAdmin):
         'is_active',
     )
     ordering = ('id',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.annotate(
-            recipe_count=Count('recipes', distinct=True)
-        )
+        return queryset.annotate(recipe_count=F('recipes_count'))
 
     @admin.display(description='Рецептов', ordering='recipe_count')
     def recipe_count(self, obj):
@@ -57,20 +60,16 @@ class CastomUserAdmin(BaseUserAdmin):
             )
         return 'No Avatar'
 
-    @admin.display(description='Подписок')
-    def following_count(self, obj):
-        return obj.authors.count()
-
-    @admin.display(description='Подписчиков')
-    def followers_count(self, obj):
-        return obj.followers.count()
-
 
 @admin.register(Subscription, site=admin_site)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('id', 'subscriber', 'author')
-    list_filter = ('subscriber', 'author')
+    list_filter = (SubscriberFilter, AuthorFilter)
+    list_select_related = ('subscriber', 'author')
     search_fields = ('subscriber__username', 'author__username')
+    autocomplete_fields = ('subscriber', 'author')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
 
 class IngredientRecipeInline(admin.TabularInline):
@@ -78,6 +77,7 @@ class IngredientRecipeInline(admin.TabularInline):
     min_num = 1
     extra = 0
     fields = ('ingredient', 'amount')
+    autocomplete_fields = ('ingredient',)
     verbose_name = 'Ингредиент'
     verbose_name_plural = 'Ингредиенты рецепта'
 
@@ -88,7 +88,7 @@ class RecipeCountAdminMixin:
         ordering='recipe_count'
     )
     def recipe_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipe_count
 
     def get_queryset(self, request):
         return super().get_queryset(request).annotate(
@@ -119,18 +119,39 @@ class RecipeAdmin(admin.ModelAdmin):
                     'get_likes', 'ingredients_list', 'image_preview',
                     'tags_list')
     search_fields = ('name', 'text', 'author__username', 'created_at')
-    list_filter = (
-        ('author', admin.RelatedOnlyFieldListFilter), 'tags',
-    )
+    list_filter = (AuthorFilter, 'tags')
+    list_select_related = ('author',)
+    autocomplete_fields = ('author',)
     filter_horizontal = ('tags',)
-    readonly_fields = ('image_preview',)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    readonly_fields = ('image_preview', 'short_code', 'short_link_clicks')
     inlines = (IngredientRecipeInline,)
     fieldsets = (
         (None, {'fields': ('name', 'author', 'tags')}),
         ('Содержимое', {'fields': ('image', 'image_preview', 'text')}),
-        ('Детали', {'fields': ('cooking_time',)}),
+        ('Детали', {'fields': (
+            'cooking_time', 'short_code', 'short_link_clicks'
+        )}),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ),
+            'tags',
+        )
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_search_index([form.instance.pk])
+        if change:
+            ShoppingCartTotal.objects.rebuild(
+                user_ids=form.instance.shoppingcarts.values('user_id')
+            )
+
     @admin.display(description='Изображение')
     def image_preview(self, recipe):
         if recipe.image:
@@ -157,15 +178,13 @@ class RecipeAdmin(admin.ModelAdmin):
             )
         return 'Нет изображения'
 
-    @admin.display(description='Лайки')
+    @admin.display(description='Лайки', ordering='favorites_count')
     def get_likes(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_count
 
     @admin.display(description='Ингредиенты')
     def ingredients_list(self, recipe):
-        ingredients = recipe.recipe_ingredients.all().select_related(
-            'ingredient'
-        )
+        ingredients = recipe.recipe_ingredients.all()
 
         ingredients_html = '<br>'.join(
             f'{ingredient.ingredient.name} '
@@ -184,7 +203,11 @@ class RecipeAdmin(admin.ModelAdmin):
 class FavoriteShoppingCartAdminMixin:
     list_display = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('user',)
+    list_filter = (UserFilter,)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
 
 @admin.register(Favorite, site=admin_site)
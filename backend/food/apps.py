@@ -7,6 +7,7 @@ class FoodConfig(AppConfig):
     verbose_name = 'Приложение "food"'
 
     def ready(self):
+        from . import signals  # noqa: F401
         from django.contrib import admin
         from django.contrib.auth import get_user_model
         User = get_user_model()
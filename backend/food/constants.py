@@ -4,3 +4,13 @@ EMAIL_MAX_LENGTH = 254
 USERNAME_MAX_LENGTH = 150
 FIRST_NAME_MAX_LENGTH = 150
 LAST_NAME_MAX_LENGTH = 150
+# Рецепты авторов, у которых подписчиков больше, не раскладываются по
+# лентам подписчиков, а подмешиваются в ленту при запросе.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+# Сколько последних рецептов автора добавляется в ленту при подписке.
+FEED_BACKFILL_SIZE = 100
+# Длина кода короткой ссылки на рецепт (алфавит shortuuid, 57 символов).
+SHORT_CODE_LENGTH = 8
+# Сколько раз новый рецепт пробует сохраниться с новым кодом, если
+# случайный код уже занят.
+SHORT_CODE_ATTEMPTS = 5
@@ -0,0 +1,64 @@
+"""Денормализованные счётчики связей (избранное, корзина, рецепты, подписки).
+
+Счётчики обновляются сигналами из food.signals атомарными UPDATE с F(),
+а sync_counters находит и исправляет расхождения пачкой.
+"""
+from collections import namedtuple
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, ShoppingCart, Subscription, User
+
+Counter = namedtuple(
+    'Counter', ('source', 'foreign_key', 'target', 'field')
+)
+
+COUNTERS = (
+    Counter(Favorite, 'recipe', Recipe, 'favorites_count'),
+    Counter(ShoppingCart, 'recipe', Recipe, 'shopping_cart_count'),
+    Counter(Recipe, 'author', User, 'recipes_count'),
+    Counter(Subscription, 'author', User, 'followers_count'),
+    Counter(Subscription, 'subscriber', User, 'following_count'),
+)
+
+
+def change_counters(instance, delta):
+    """Изменяет на delta все счётчики, которые считают строки instance."""
+    for counter in COUNTERS:
+        if not isinstance(instance, counter.source):
+            continue
+        targets = counter.target.objects.filter(
+            pk=getattr(instance, f'{counter.foreign_key}_id')
+        )
+        if delta < 0:
+            targets = targets.filter(**{f'{counter.field}__gte': -delta})
+        targets.update(**{counter.field: F(counter.field) + delta})
+
+
+def actual_count(counter):
+    """Подзапрос с фактическим числом строк для counter.target."""
+    return Coalesce(
+        Subquery(
+            counter.source.objects.filter(
+                **{counter.foreign_key: OuterRef('pk')}
+            ).order_by().values(counter.foreign_key).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        Value(0),
+    )
+
+
+def drifted(counter):
+    """Строки counter.target, у которых счётчик расходится с фактом."""
+    return counter.target.objects.annotate(
+        actual=actual_count(counter)
+    ).exclude(**{counter.field: F('actual')})
+
+
+def repair(counter):
+    """Пересчитывает счётчик у расходящихся строк одним UPDATE."""
+    return counter.target.objects.filter(
+        pk__in=drifted(counter).values('pk')
+    ).update(**{counter.field: actual_count(counter)})
@@ -0,0 +1,164 @@
+"""Лента подписок: новые рецепты авторов, на которых подписан пользователь.
+
+Лента материализована в TimelineEntry: при публикации рецепта фоновая
+задача добавляет по строке каждому подписчику автора, при подписке в
+ленту добавляются последние FEED_BACKFILL_SIZE рецептов автора, при
+отписке его рецепты из ленты удаляются. Рецепты авторов, у которых
+подписчиков больше FEED_FANOUT_MAX_FOLLOWERS, не раскладываются по
+лентам: их подмешивает запрос ленты (feed_page). Когда подписчиков
+снова становится FEED_FANOUT_MAX_FOLLOWERS, последние рецепты автора
+добавляются в ленты всех его подписчиков (backfill_followers).
+"""
+import heapq
+from itertools import groupby, islice
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .constants import FEED_BACKFILL_SIZE, FEED_FANOUT_MAX_FOLLOWERS
+from .models import Recipe, Subscription, TimelineEntry, User
+
+BATCH_SIZE = 1000
+
+
+def fans_out(author):
+    return author.followers_count <= FEED_FANOUT_MAX_FOLLOWERS
+
+
+def fan_out(recipe_id):
+    """Добавляет рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.select_related('author').filter(
+        pk=recipe_id
+    ).first()
+    if recipe is None or not fans_out(recipe.author):
+        return 0
+    follower_ids = Subscription.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('subscriber_id', flat=True).iterator()
+    count = 0
+    while batch := list(islice(follower_ids, BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    recipe_id=recipe.pk,
+                    author_id=recipe.author_id,
+                    created_at=recipe.created_at,
+                )
+                for user_id in batch
+            ),
+            ignore_conflicts=True,
+        )
+        count += len(batch)
+    return count
+
+
+def backfill(user_id, author_id, size=FEED_BACKFILL_SIZE):
+    """Добавляет в ленту пользователя последние рецепты автора."""
+    author = User.objects.get(pk=author_id)
+    if not fans_out(author):
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                created_at=created_at,
+            )
+            for recipe_id, created_at in author.recipes.order_by(
+                '-created_at', '-id'
+            ).values_list('pk', 'created_at')[:size]
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты пользователя рецепты автора."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def backfill_followers(author_ids):
+    """Добавляет последние рецепты авторов в ленты их подписчиков."""
+    for user_id, author_id in Subscription.objects.filter(
+        author_id__in=author_ids
+    ).values_list('subscriber_id', 'author_id').iterator():
+        backfill(user_id, author_id)
+
+
+def rebuild_timelines():
+    """
+    Пересоздаёт ленты всех пользователей по текущим подпискам одним
+    INSERT ... SELECT: ROW_NUMBER() отбирает последние FEED_BACKFILL_SIZE
+    рецептов каждого автора, как backfill.
+    """
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TimelineEntry._meta.db_table} '
+                '(user_id, recipe_id, author_id, created_at) '
+                'SELECT subscription.subscriber_id, recipe.id, '
+                'recipe.author_id, recipe.created_at '
+                f'FROM {Subscription._meta.db_table} subscription '
+                f'JOIN {User._meta.db_table} author '
+                'ON author.id = subscription.author_id '
+                'JOIN (SELECT id, author_id, created_at, ROW_NUMBER() OVER ('
+                'PARTITION BY author_id ORDER BY created_at DESC, id DESC'
+                f') AS position FROM {Recipe._meta.db_table}) recipe '
+                'ON recipe.author_id = subscription.author_id '
+                'WHERE author.followers_count <= %s AND recipe.position <= %s',
+                (FEED_FANOUT_MAX_FOLLOWERS, FEED_BACKFILL_SIZE)
+            )
+
+
+def after(position, reverse, pk_field):
+    """Условие keyset: строки после ключа (created_at, id) в порядке ленты."""
+    created_at, pk = position
+    lookup = 'gt' if reverse else 'lt'
+    return (
+        Q(**{f'created_at__{lookup}': created_at})
+        | Q(created_at=created_at, **{f'{pk_field}__{lookup}': pk})
+    )
+
+
+def feed_page(user, limit, position=None, reverse=False):
+    """
+    Ключи (created_at, id) рецептов страницы ленты: до limit ключей после
+    position от новых к старым, при reverse — до position от старых к
+    новым.
+
+    Записи ленты читаются по индексу (user, -created_at, -recipe), рецепты
+    авторов без раскладки — отдельным запросом по индексу
+    (author, -created_at, -id), только если такие авторы есть в подписках;
+    обе выборки ограничены limit строками и сливаются в памяти. Рецепт
+    автора, который перестал раскладываться по лентам, может оказаться в
+    обеих выборках — он выдаётся один раз.
+    """
+    sign = '' if reverse else '-'
+    entries = TimelineEntry.objects.filter(user=user)
+    # id авторов выбираются заранее: с подзапросом в IN и условием keyset
+    # SQLite не использует индекс по (author, created_at).
+    pull_author_ids = list(User.objects.filter(
+        authors__subscriber=user,
+        followers_count__gt=FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('pk', flat=True))
+    recipes = Recipe.objects.filter(author_id__in=pull_author_ids)
+    if position is not None:
+        entries = entries.filter(after(position, reverse, 'recipe_id'))
+        recipes = recipes.filter(after(position, reverse, 'id'))
+    sources = [entries.order_by(
+        f'{sign}created_at', f'{sign}recipe_id'
+    ).values_list('created_at', 'recipe_id')[:limit]]
+    if pull_author_ids:
+        sources.append(recipes.order_by(
+            f'{sign}created_at', f'{sign}id'
+        ).values_list('created_at', 'id')[:limit])
+    rows = heapq.merge(*sources, reverse=not reverse)
+    return [key for key, _ in islice(groupby(rows), limit)]
+
+
+def merged_feed_recipes(user):
+    """Лента без материализации: рецепты всех авторов из подписок."""
+    return Recipe.objects.filter(author__authors__subscriber=user)
@@ -1,5 +1,6 @@
 from django.contrib.admin import SimpleListFilter
-from django.db.models import Exists, OuterRef
+from django.contrib.admin.views.main import PAGE_VAR
+from django.db.models import Exists, OuterRef, Q
 
 from .models import Subscription
 
@@ -52,3 +53,51 @@ class HasRecipesFilter(BaseBooleanFilter):
         if self.value() == 'no':
             return queryset.filter(recipe_count=0)
         return queryset
+
+
+class UserInputFilter(SimpleListFilter):
+    """
+    Фильтр по пользователю в поле parameter_name: ник или email вводится
+    в поле, а не выбирается из списка всех пользователей.
+    """
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # Без вариантов фильтр не показывается на странице.
+        return (('', ''),)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(
+                remove=[self.parameter_name]
+            ),
+            'hidden_params': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, PAGE_VAR)
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        return queryset.filter(
+            Q(**{f'{self.parameter_name}__username': value})
+            | Q(**{f'{self.parameter_name}__email': value})
+        )
+
+
+class UserFilter(UserInputFilter):
+    title = 'Пользователь'
+    parameter_name = 'user'
+
+
+class SubscriberFilter(UserInputFilter):
+    title = 'Подписчик'
+    parameter_name = 'subscriber'
+
+
+class AuthorFilter(UserInputFilter):
+    title = 'Автор'
+    parameter_name = 'author'
@@ -0,0 +1,151 @@
+"""Уменьшенные варианты картинок рецептов и аватарок.
+
+Для каждого размера сохраняются WebP и JPEG без метаданных (EXIF, ICC):
+ориентация из EXIF применяется к самим пикселям, а info у изображения
+очищается перед сохранением. Варианты строятся фоновой задачей
+(food.tasks, обработчик run_worker), чтобы не задерживать ответ, и
+записываются в JSON-поле модели: {'source': исходный файл, 'files':
+{размер: {формат: путь}}}. По source видно, что варианты устарели после
+замены картинки.
+"""
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from jobs.registry import enqueue, enqueue_many
+from .models import ContentVersion, Recipe, User
+
+Size = namedtuple('Size', ('width', 'height', 'crop'))
+Target = namedtuple(
+    'Target', ('image_field', 'variants_field', 'sizes', 'version')
+)
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+TARGETS = {
+    Recipe: Target('image', 'image_variants', {
+        'card': Size(600, 400, False),
+        'detail': Size(1280, 1280, False),
+    }, 'recipe'),
+    User: Target('avatar', 'avatar_variants', {
+        'avatar': Size(200, 200, True),
+    }, 'user'),
+}
+
+
+def is_stale(instance):
+    """Варианты не соответствуют текущей картинке объекта."""
+    target = TARGETS[type(instance)]
+    image = getattr(instance, target.image_field)
+    variants = getattr(instance, target.variants_field) or {}
+    return variants.get('source') != (image.name or None)
+
+
+def schedule_variants(*instances):
+    """Ставит в очередь построение вариантов картинок instances."""
+    enqueue_many('food.build_image_variants', (
+        {'model': instance._meta.label_lower, 'pk': instance.pk}
+        for instance in instances
+    ))
+
+
+def schedule_delete(variants):
+    """Ставит в очередь удаление файлов вариантов."""
+    schedule_delete_files(list(variant_paths(variants)))
+
+
+def schedule_delete_files(paths):
+    if paths:
+        enqueue('food.delete_files', paths=paths)
+
+
+def variant_paths(variants):
+    for formats in (variants or {}).get('files', {}).values():
+        yield from formats.values()
+
+
+def delete_files(paths):
+    for path in paths:
+        default_storage.delete(path)
+
+
+def build_variants(model, pk):
+    """
+    Строит варианты картинки объекта и сохраняет их, если картинка не
+    сменилась за время обработки; файлы прежних вариантов удаляются.
+    """
+    target = TARGETS[model]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not is_stale(instance):
+        return
+    image = getattr(instance, target.image_field)
+    variants = {}
+    if image:
+        with image.open('rb'):
+            source = Image.open(image)
+            source.load()
+        variants = {
+            'source': image.name,
+            'files': render_variants(image.name, source, target.sizes),
+        }
+    changes = {target.variants_field: variants}
+    if model is Recipe:
+        changes['updated_at'] = timezone.now()
+    if model.objects.filter(
+        pk=pk, **{target.image_field: image.name}
+    ).update(**changes):
+        old_variants = getattr(instance, target.variants_field)
+        ContentVersion.objects.bump(target.version)
+    else:
+        old_variants = variants
+    delete_files(variant_paths(old_variants))
+
+
+def render_variants(name, source, sizes):
+    """Сохраняет варианты source всех размеров sizes во всех форматах."""
+    source = ImageOps.exif_transpose(source)
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    files = {}
+    for size_name, size in sizes.items():
+        if size.crop:
+            image = ImageOps.fit(
+                source, (size.width, size.height), Image.LANCZOS
+            )
+        else:
+            image = source.copy()
+            image.thumbnail((size.width, size.height), Image.LANCZOS)
+        files[size_name] = {
+            extension: default_storage.save(
+                os.path.join(
+                    directory, 'variants', f'{stem}_{size_name}.{extension}'
+                ),
+                ContentFile(encode(image, image_format, options))
+            )
+            for extension, (image_format, options) in FORMATS.items()
+        }
+    return files
+
+
+def encode(image, image_format, options):
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    if has_alpha and image_format == 'JPEG':
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.info = {}
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
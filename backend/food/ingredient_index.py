@@ -0,0 +1,146 @@
+"""Индекс ингредиентов в памяти процесса для автодополнения.
+
+Ингредиентов немного (тысячи), поэтому их удобно держать в памяти:
+поиск по префиксу — бинарный поиск по отсортированным нормализованным
+названиям, без запроса к БД на каждое нажатие клавиши. Индекс
+перестраивается лениво: после сохранения/удаления Ingredient и после
+load_ingredients (invalidate меняет версию в кеше — при общем кеше это
+видят все процессы), а также не реже раза в INDEX_TTL секунд.
+"""
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter, namedtuple
+
+from django.core.cache import cache
+
+from .models import Ingredient
+
+INDEX_TTL = 5 * 60
+VERSION_CACHE_KEY = 'ingredient_index_version'
+WORD_SEPARATORS = ' -(,'
+
+IndexState = namedtuple('IndexState', (
+    'ingredients', 'by_id', 'names', 'words', 'ngrams', 'ngram_counts',
+    'version', 'built_at',
+))
+
+
+def normalize(text):
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def get_ngrams(text, size):
+    text = f' {text} '
+    return {text[start:start + size] for start in range(len(text) - size + 1)}
+
+
+def prefix_range(keys, prefix):
+    """Позиции ингредиентов, ключ которых начинается с prefix."""
+    start = bisect_left(keys, (prefix,))
+    stop = bisect_left(keys, (prefix + '\uffff',))
+    return [position for _, position in keys[start:stop]]
+
+
+class IngredientIndex:
+    NGRAM_SIZE = 3
+    FUZZY_THRESHOLD = 0.3
+    FUZZY_LIMIT = 20
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+
+    def invalidate(self):
+        """Сбрасывает индекс в этом процессе и его версию в кеше."""
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        self.state = None
+
+    def all(self):
+        return list(self.get_state().ingredients)
+
+    def get(self, pk):
+        return self.get_state().by_id.get(pk)
+
+    def search(self, query):
+        """
+        Ингредиенты, подходящие под query, в порядке релевантности:
+        точное совпадение, совпадение начала названия, совпадение начала
+        одного из слов названия. Если ничего не нашлось — похожие
+        названия по n-граммам (запрос с опечаткой).
+        """
+        state = self.get_state()
+        query = normalize(query)
+        if not query:
+            return list(state.ingredients)
+        found = dict.fromkeys(prefix_range(state.names, query))
+        found.update(dict.fromkeys(prefix_range(state.words, query)))
+        positions = found or self.fuzzy(state, query)
+        return [state.ingredients[position] for position in positions]
+
+    def fuzzy(self, state, query):
+        query_ngrams = get_ngrams(query, self.NGRAM_SIZE)
+        overlaps = Counter()
+        for ngram in query_ngrams:
+            overlaps.update(state.ngrams.get(ngram, ()))
+        scored = sorted(
+            (
+                2 * overlap / (
+                    len(query_ngrams) + state.ngram_counts[position]
+                ),
+                -position,
+            )
+            for position, overlap in overlaps.items()
+        )
+        return [
+            -position
+            for score, position in reversed(scored[-self.FUZZY_LIMIT:])
+            if score >= self.FUZZY_THRESHOLD
+        ]
+
+    def get_state(self):
+        state = self.state
+        version = cache.get(VERSION_CACHE_KEY)
+        if (
+            state is None
+            or state.version != version
+            or time.monotonic() - state.built_at > INDEX_TTL
+        ):
+            with self.lock:
+                if self.state is state:
+                    self.state = self.build(version)
+                state = self.state
+        return state
+
+    def build(self, version):
+        ingredients = list(Ingredient.objects.order_by('name'))
+        names, words, ngrams, ngram_counts = [], [], {}, []
+        for position, ingredient in enumerate(ingredients):
+            name = normalize(ingredient.name)
+            names.append((name, position))
+            words.extend(
+                (name[start:], position)
+                for start in range(1, len(name))
+                if name[start - 1] in WORD_SEPARATORS
+                and name[start] not in WORD_SEPARATORS
+            )
+            name_ngrams = get_ngrams(name, self.NGRAM_SIZE)
+            ngram_counts.append(len(name_ngrams))
+            for ngram in name_ngrams:
+                ngrams.setdefault(ngram, []).append(position)
+        names.sort()
+        words.sort()
+        return IndexState(
+            ingredients=ingredients,
+            by_id={ingredient.id: ingredient for ingredient in ingredients},
+            names=names,
+            words=words,
+            ngrams=ngrams,
+            ngram_counts=ngram_counts,
+            version=version,
+            built_at=time.monotonic(),
+        )
+
+
+ingredient_index = IngredientIndex()
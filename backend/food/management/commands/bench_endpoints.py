@@ -0,0 +1,333 @@
+import base64
+import json
+import math
+import tempfile
+import time
+from collections import namedtuple
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.exporters import EXPORTERS
+from api.urls import urlpatterns
+from food.models import Ingredient, Recipe, Tag, User
+
+Scenario = namedtuple(
+    'Scenario', ('name', 'method', 'url_name', 'args', 'query', 'auth',
+                 'data', 'status')
+)
+
+PASSWORD = 'bench-password-1'
+# Сценарии регистрации и смены логина через почту не замеряются.
+EXCLUDED_URL_NAMES = {
+    'user-activation', 'user-resend-activation', 'user-reset-password',
+    'user-reset-password-confirm', 'user-reset-username',
+    'user-reset-username-confirm', 'user-set-username',
+}
+
+
+def url_names(patterns):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from url_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * percent / 100) - 1)]
+
+
+def image_data_uri():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (214, 150, 92)).save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95 времени ответа и число запросов к БД для всех '
+        'эндпоинтов api/urls.py на текущих данных (см. seed_fake_data). '
+        'Изменения данных откатываются. С --baseline результаты '
+        'сравниваются с сохранёнными, и при замедлении команда завершается '
+        'с ошибкой.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--only', help='Замерять только сценарии, в имени которых '
+                           'есть эта строка.'
+        )
+        parser.add_argument(
+            '--baseline', help='Файл JSON с базовыми замерами.'
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результаты в --baseline вместо сравнения.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый относительный рост p95.'
+        )
+        parser.add_argument(
+            '--min-delta', type=float, default=5,
+            help='Рост p95 меньше стольких мс не считается регрессией.'
+        )
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Не очищать кеш перед запросами (замер попаданий в кеш).'
+        )
+
+    def handle(self, *args, **options):
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('Для --save-baseline нужен --baseline.')
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'bench_endpoints',
+            }},
+        ), transaction.atomic():
+            results = self.run_scenarios(options)
+            transaction.set_rollback(True)
+        if options['save_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовые замеры записаны в {options["baseline"]}.'
+            ))
+        elif options['baseline']:
+            self.compare(results, options)
+
+    def run_scenarios(self, options):
+        scenarios = self.scenarios()
+        uncovered = sorted(
+            set(url_names(urlpatterns)) - EXCLUDED_URL_NAMES
+            - {scenario.url_name for scenario in scenarios}
+        )
+        if uncovered:
+            self.stdout.write(self.style.WARNING(
+                f'Эндпоинты без сценария: {", ".join(uncovered)}'
+            ))
+        if options['only']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if options['only'] in scenario.name
+            ]
+        self.stdout.write(
+            f'{"сценарий":<34} {"p50, мс":>9} {"p95, мс":>9} '
+            f'{"запросов":>9}'
+        )
+        results, failed = {}, []
+        for scenario in scenarios:
+            timings, queries = [], []
+            for number in range(options['warmup'] + options['repeat']):
+                seconds, count, status = self.measure(
+                    scenario, options['warm_cache']
+                )
+                if status != scenario.status:
+                    failed.append(
+                        f'{scenario.name}: ответ {status}, ожидался '
+                        f'{scenario.status}'
+                    )
+                    break
+                if number >= options['warmup']:
+                    timings.append(seconds * 1000)
+                    queries.append(count)
+            if not timings:
+                continue
+            results[scenario.name] = {
+                'p50': round(percentile(timings, 50), 2),
+                'p95': round(percentile(timings, 95), 2),
+                'queries': max(queries),
+            }
+            self.stdout.write(
+                f'{scenario.name:<34} {results[scenario.name]["p50"]:>9.2f} '
+                f'{results[scenario.name]["p95"]:>9.2f} {max(queries):>9}'
+            )
+        if failed:
+            raise CommandError(
+                'Сценарии завершились ошибкой:\n' + '\n'.join(failed)
+            )
+        return results
+
+    def measure(self, scenario, warm_cache):
+        """Выполняет запрос в откатываемой транзакции."""
+        if not warm_cache:
+            cache.clear()
+        client = self.clients[scenario.auth]
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(client, scenario.method)(
+                    reverse(f'api:{scenario.url_name}', args=scenario.args)
+                    + (f'?{scenario.query}' if scenario.query else ''),
+                    scenario.data, format='json'
+                )
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                seconds = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return seconds, len(queries), response.status_code
+
+    def scenarios(self):
+        """Сценарии по всем эндпоинтам; id берутся из текущих данных."""
+        viewer = User.objects.filter(recipes_count__gt=0).order_by(
+            '-following_count', '-recipes_count'
+        ).first()
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        ingredient = Ingredient.objects.first()
+        if None in (viewer, recipe, ingredient) or not tags:
+            raise CommandError(
+                'Недостаточно данных: заполните базу (seed_fake_data).'
+            )
+        viewer.set_password(PASSWORD)
+        viewer.save(update_fields=['password'])
+        token, _ = Token.objects.get_or_create(user=viewer)
+        self.clients = {False: APIClient(), True: APIClient()}
+        self.clients[True].credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        own_recipe = viewer.recipes.first()
+        favorite = viewer.favorites.first()
+        not_favorite = Recipe.objects.exclude(favorites__user=viewer).first()
+        cart = viewer.shoppingcarts.first()
+        not_cart = Recipe.objects.exclude(shoppingcarts__user=viewer).first()
+        followed = User.objects.filter(authors__subscriber=viewer).first()
+        not_followed = User.objects.exclude(pk=viewer.pk).exclude(
+            authors__subscriber=viewer
+        ).first()
+        recipe_data = {
+            'name': 'Замер', 'text': 'Замер', 'cooking_time': 10,
+            'image': image_data_uri(),
+            'tags': list(Tag.objects.values_list('pk', flat=True)[:2]),
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in Ingredient.objects.
+                values_list('pk', flat=True)[:5]
+            ],
+        }
+        scenarios = [
+            ('api-root', 'get', 'api-root', (), '', False, None, 200),
+            ('tags', 'get', 'tag-list', (), '', False, None, 200),
+            ('tag', 'get', 'tag-detail', (Tag.objects.first().pk,), '',
+             False, None, 200),
+            ('ingredients', 'get', 'ingredient-list', (), '', False, None,
+             200),
+            ('ingredients?name', 'get', 'ingredient-list', (),
+             f'name={ingredient.name[:2]}', False, None, 200),
+            ('ingredient', 'get', 'ingredient-detail', (ingredient.pk,), '',
+             False, None, 200),
+            ('users', 'get', 'user-list', (), '', False, None, 200),
+            ('user', 'get', 'user-detail', (recipe.author_id,), '', False,
+             None, 200),
+            ('users/me', 'get', 'user-me', (), '', True, None, 200),
+            ('subscriptions', 'get', 'user-subscriptions', (),
+             'recipes_limit=3', True, None, 200),
+            ('recipes', 'get', 'recipe-list', (), '', False, None, 200),
+            ('recipes (auth)', 'get', 'recipe-list', (), '', True, None,
+             200),
+            ('recipes?tags', 'get', 'recipe-list', (),
+             '&'.join(f'tags={slug}' for slug in tags), False, None, 200),
+            ('recipes?author', 'get', 'recipe-list', (),
+             f'author={recipe.author_id}', False, None, 200),
+            ('recipes?is_favorited', 'get', 'recipe-list', (),
+             'is_favorited=1', True, None, 200),
+            ('recipes?is_in_shopping_cart', 'get', 'recipe-list', (),
+             'is_in_shopping_cart=1', True, None, 200),
+            ('recipes?search', 'get', 'recipe-list', (),
+             f'search={recipe.name.split()[0]}', False, None, 200),
+            ('recipe', 'get', 'recipe-detail', (recipe.pk,), '', False,
+             None, 200),
+            ('recipe (auth)', 'get', 'recipe-detail', (recipe.pk,), '',
+             True, None, 200),
+            ('recipes/feed', 'get', 'recipe-feed', (), '', True, None, 200),
+            ('recipe get-link', 'get', 'recipe-get-link', (recipe.pk,), '',
+             False, None, 200),
+            *(
+                (f'download_shopping_cart ({file_format})', 'get',
+                 'recipe-download-shopping-cart', (), f'format={file_format}',
+                 True, None, 200)
+                for file_format in EXPORTERS
+            ),
+            ('login', 'post', 'login', (), '', False,
+             {'email': viewer.email, 'password': PASSWORD}, 200),
+            ('logout', 'post', 'logout', (), '', True, None, 204),
+            ('users create', 'post', 'user-list', (), '', False, {
+                'email': 'bench@example.com', 'username': 'bench',
+                'first_name': 'Замер', 'last_name': 'Замер',
+                'password': PASSWORD,
+            }, 201),
+            ('users set_password', 'post', 'user-set-password', (), '', True,
+             {'current_password': PASSWORD, 'new_password': PASSWORD[::-1]},
+             204),
+            ('avatar put', 'put', 'user-avatar', (), '', True,
+             {'avatar': image_data_uri()}, 200),
+            ('avatar delete', 'delete', 'user-avatar', (), '', True, None,
+             204),
+            ('recipe create', 'post', 'recipe-list', (), '', True,
+             recipe_data, 201),
+        ]
+        if own_recipe:
+            scenarios += [
+                ('recipe update', 'patch', 'recipe-detail', (own_recipe.pk,),
+                 '', True, recipe_data, 200),
+                ('recipe delete', 'delete', 'recipe-detail',
+                 (own_recipe.pk,), '', True, None, 204),
+            ]
+        for name, url_name, add, remove in (
+            ('favorite', 'recipe-favorite', not_favorite,
+             favorite and favorite.recipe),
+            ('shopping_cart', 'recipe-shopping-cart', not_cart,
+             cart and cart.recipe),
+            ('subscribe', 'user-subscribe', not_followed, followed),
+        ):
+            if add:
+                scenarios.append((f'{name} add', 'post', url_name, (add.pk,),
+                                  '', True, None, 201))
+            if remove:
+                scenarios.append((f'{name} remove', 'delete', url_name,
+                                  (remove.pk,), '', True, None, 204))
+        return [Scenario(*scenario) for scenario in scenarios]
+
+    def compare(self, results, options):
+        with open(options['baseline'], encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if result['queries'] > base['queries']:
+                regressions.append(
+                    f'{name}: запросов {base["queries"]} → '
+                    f'{result["queries"]}'
+                )
+            if (
+                result['p95'] > base['p95'] * (1 + options['tolerance'])
+                and result['p95'] - base['p95'] >= options['min_delta']
+            ):
+                regressions.append(
+                    f'{name}: p95 {base["p95"]:.2f} → {result["p95"]:.2f} мс'
+                )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно базовых замеров:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Регрессий относительно базовых замеров нет.'
+        ))
@@ -0,0 +1,107 @@
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.test.utils import CaptureQueriesContext
+
+from api.constants import PAGINATION_LIMIT
+from food.feed import fan_out, feed_page, merged_feed_recipes
+from food.models import Recipe, TimelineEntry, User
+
+
+def walk(recipes, pages, page_size):
+    """Читает pages страниц ленты по курсору (created_at, id)."""
+    recipes = recipes.order_by('-created_at', '-id')
+    ids, page = [], recipes
+    for _ in range(pages):
+        rows = list(page.values_list('pk', 'created_at')[:page_size])
+        if not rows:
+            break
+        ids.extend(pk for pk, _ in rows)
+        last_id, last_created_at = rows[-1]
+        page = recipes.filter(
+            Q(created_at__lt=last_created_at)
+            | Q(created_at=last_created_at, pk__lt=last_id)
+        )
+    return ids
+
+
+def walk_feed(user, pages, page_size):
+    """Читает pages страниц материализованной ленты (feed_page)."""
+    ids, position = [], None
+    for _ in range(pages):
+        keys = feed_page(user, page_size, position)
+        if not keys:
+            break
+        ids.extend(pk for _, pk in keys)
+        position = keys[-1]
+    return ids
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленту подписок из материализованных записей '
+        '(TimelineEntry) с выборкой рецептов всех авторов из подписок '
+        'при запросе, а также стоимость раскладки рецепта по лентам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int,
+            help='id читателя; по умолчанию — с наибольшим числом подписок.'
+        )
+        parser.add_argument('--pages', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=PAGINATION_LIMIT)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        users = User.objects.annotate(following=Count('followers'))
+        if options['user']:
+            users = users.filter(pk=options['user'])
+        user = users.order_by('-following').first()
+        if user is None or not user.following:
+            raise CommandError('Нет пользователя с подписками.')
+        self.stdout.write(
+            f'Читатель {user}: подписок {user.following}, записей в ленте '
+            f'{TimelineEntry.objects.filter(user=user).count()}.'
+        )
+        recipes = merged_feed_recipes(user)
+        results = {}
+        for label, read in (
+            ('лента', lambda: walk_feed(
+                user, options['pages'], options['page_size']
+            )),
+            ('запрос', lambda: walk(
+                recipes, options['pages'], options['page_size']
+            )),
+        ):
+            results[label] = read()
+            seconds = min(timeit.repeat(
+                read, number=1, repeat=options['repeat']
+            ))
+            self.stdout.write(
+                f'{label:>7}: {seconds * 1000:8.2f} мс на '
+                f'{options["pages"]} стр.'
+            )
+        if results['лента'] != results['запрос']:
+            self.stdout.write(self.style.WARNING(
+                'Ленты расходятся: выполните rebuild_timelines или '
+                'увеличьте FEED_BACKFILL_SIZE.'
+            ))
+        self.bench_fan_out()
+
+    def bench_fan_out(self):
+        author = User.objects.order_by('-followers_count').first()
+        recipe = Recipe.objects.filter(author=author).first()
+        if recipe is None:
+            return
+        with transaction.atomic():
+            TimelineEntry.objects.filter(recipe=recipe).delete()
+            with CaptureQueriesContext(connection) as queries:
+                seconds = timeit.timeit(lambda: fan_out(recipe.pk), number=1)
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f'Раскладка рецепта автора {author} по {author.followers_count} '
+            f'лентам: {seconds * 1000:.2f} мс, {len(queries)} запросов.'
+        )
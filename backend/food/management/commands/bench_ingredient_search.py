@@ -0,0 +1,56 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from api.filters import IngredientFilter
+from food.ingredient_index import ingredient_index
+from food.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск ингредиентов по индексу в памяти с поиском '
+        'через ORM (IngredientFilter).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            self.stderr.write('Нет ингредиентов: выполните load_ingredients.')
+            return
+        rng = random.Random(options['seed'])
+        queries = [
+            rng.choice(names)[:rng.randint(1, 6)]
+            for _ in range(options['queries'])
+        ]
+        ingredient_index.get_state()
+
+        def index_search():
+            for query in queries:
+                ingredient_index.search(query)
+
+        def orm_search():
+            for query in queries:
+                list(IngredientFilter(
+                    {'name': query}, queryset=Ingredient.objects.all()
+                ).qs)
+
+        results = {}
+        for label, search in (('index', index_search), ('orm', orm_search)):
+            seconds = min(timeit.repeat(
+                search, number=1, repeat=options['repeat']
+            ))
+            results[label] = seconds / len(queries) * 1e6
+            self.stdout.write(
+                f'{label:>5}: {results[label]:10.1f} мкс/запрос'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс быстрее в {results["orm"] / results["index"]:.1f} раз '
+            f'({len(names)} ингредиентов, {len(queries)} запросов).'
+        ))
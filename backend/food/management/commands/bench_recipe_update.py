@@ -0,0 +1,144 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.serializers import RecipeWriteSerializer
+from food.models import (Ingredient, IngredientRecipe, Recipe,
+                         ShoppingCartTotal, Tag)
+from food.search import update_search_index
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def legacy_update(recipe, ingredients, tags):
+    """Прежний способ: удалить все ингредиенты и вставить заново."""
+    return lambda: legacy_write(recipe, ingredients, tags)
+
+
+def legacy_write(recipe, ingredients, tags):
+    old_amounts = dict(recipe.recipe_ingredients.values_list(
+        'ingredient_id', 'amount'
+    ))
+    IngredientRecipe.objects.filter(recipe=recipe).delete()
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(
+            recipe=recipe, ingredient_id=item['id'], amount=item['amount']
+        )
+        for item in ingredients
+    )
+    ShoppingCartTotal.objects.change_recipe(recipe, old_amounts, {
+        item['id']: item['amount'] for item in ingredients
+    })
+    recipe.tags.set(tags)
+    recipe.save()
+    update_search_index([recipe.pk])
+
+
+def diff_update(recipe, ingredients, tags):
+    serializer = RecipeWriteSerializer(recipe, partial=True, data={
+        'ingredients': ingredients, 'tags': tags,
+    })
+    serializer.is_valid(raise_exception=True)
+    return serializer.save
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает обновление рецепта по разнице с удалением и повторной '
+        'вставкой всех ингредиентов: число запросов и записанных строк '
+        'для типичных правок. Изменения откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipe', type=int, help='id рецепта.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['recipe']:
+            recipes = recipes.filter(pk=options['recipe'])
+        recipe = recipes.first()
+        if recipe is None:
+            raise CommandError('Рецепт не найден.')
+        ingredients = [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )
+        ]
+        tags = list(recipe.tags.values_list('pk', flat=True))
+        spare_ingredient = Ingredient.objects.exclude(
+            pk__in=[item['id'] for item in ingredients]
+        ).first()
+        spare_tag = Tag.objects.exclude(pk__in=tags).first()
+        if not ingredients or spare_ingredient is None:
+            raise CommandError(
+                'Нужен рецепт с ингредиентами и хотя бы один ингредиент '
+                'не из него.'
+            )
+        edits = {
+            'без изменений': (ingredients, tags),
+            'изменено количество': (
+                [{**ingredients[0], 'amount': ingredients[0]['amount'] + 1},
+                 *ingredients[1:]],
+                tags,
+            ),
+            'добавлен ингредиент': (
+                [*ingredients, {'id': spare_ingredient.pk, 'amount': 1}],
+                tags,
+            ),
+            'убран ингредиент': (ingredients[1:] or ingredients, tags),
+            'добавлен тег': (
+                ingredients, tags + [spare_tag.pk] if spare_tag else tags
+            ),
+        }
+        self.stdout.write(
+            f'Рецепт {recipe.pk}: {len(ingredients)} ингредиентов, '
+            f'{len(tags)} тегов.'
+        )
+        for edit, (new_ingredients, new_tags) in edits.items():
+            self.stdout.write(f'{edit}:')
+            for label, update in (
+                ('удаление и вставка', legacy_update),
+                ('по разнице', diff_update),
+            ):
+                queries, rows = self.measure(
+                    update, recipe, new_ingredients, new_tags
+                )
+                writes = sum(
+                    query['sql'].lstrip().startswith(WRITE_STATEMENTS)
+                    for query in queries
+                )
+                self.stdout.write(
+                    f'  {label:>18}: {len(queries):3} запросов '
+                    f'({writes} на запись), строк ингредиентов: '
+                    f'вставлено {rows["inserted"]}, изменено '
+                    f'{rows["updated"]}, удалено {rows["deleted"]}'
+                )
+
+    def measure(self, update, recipe, ingredients, tags):
+        """
+        Выполняет обновление в откатываемой транзакции. Возвращает запросы
+        записи (без валидации данных) и число вставленных, изменённых и
+        удалённых строк ингредиентов рецепта.
+        """
+        with transaction.atomic():
+            recipe = Recipe.objects.get(pk=recipe.pk)
+            before = self.ingredient_rows(recipe)
+            write = update(recipe, ingredients, tags)
+            with CaptureQueriesContext(connection) as queries:
+                write()
+            after = self.ingredient_rows(recipe)
+            transaction.set_rollback(True)
+        return queries.captured_queries, {
+            'inserted': len(after.keys() - before.keys()),
+            'updated': sum(
+                before[pk] != after[pk] for pk in before.keys() & after.keys()
+            ),
+            'deleted': len(before.keys() - after.keys()),
+        }
+
+    @staticmethod
+    def ingredient_rows(recipe):
+        return dict(IngredientRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('pk', 'amount'))
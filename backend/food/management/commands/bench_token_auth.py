@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import CachedTokenAuthentication, token_cache
+from food.management.commands.bench_endpoints import percentile
+from food.models import User
+
+CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'bench_token_auth',
+}}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время аутентификации запроса по токену и число запросов '
+        'к БД: TokenAuthentication из DRF, CachedTokenAuthentication с '
+        'кешем процесса и с общим кешем (кеш процесса пуст). Токены '
+        'создаются для первых --tokens пользователей, изменения '
+        'откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with override_settings(CACHES=CACHES), transaction.atomic():
+            keys = self.create_tokens(options['tokens'])
+            self.stdout.write(
+                f'{"вариант":<12} {"p50, мкс":>9} {"p95, мкс":>9} '
+                f'{"запросов":>9}'
+            )
+            for name, authentication, settings in (
+                ('db', TokenAuthentication, {}),
+                ('cached', CachedTokenAuthentication, {}),
+                ('shared', CachedTokenAuthentication,
+                 {'TOKEN_CACHE_SHARED': True}),
+            ):
+                token_cache.clear()
+                with override_settings(**settings):
+                    self.measure(
+                        name, authentication, keys, options['repeat'],
+                        clear_local=name == 'shared'
+                    )
+            token_cache.clear()
+            transaction.set_rollback(True)
+
+    def create_tokens(self, count):
+        users = list(User.objects.filter(is_active=True).order_by('pk')[
+            :count
+        ])
+        if not users:
+            raise CommandError('Нет активных пользователей.')
+        return [Token.objects.get_or_create(user=user)[0].key
+                for user in users]
+
+    def measure(self, name, authentication, keys, repeat, clear_local):
+        factory = APIRequestFactory()
+        requests = [
+            factory.get('/api/recipes/', HTTP_AUTHORIZATION=f'Token {key}')
+            for key in keys
+        ]
+        timings, queries = [], []
+
+        def count_query(execute, *args):
+            queries.append(None)
+            return execute(*args)
+
+        with connection.execute_wrapper(count_query):
+            for number in range(repeat):
+                if clear_local:
+                    token_cache.clear()
+                request = Request(requests[number % len(requests)])
+                started = time.perf_counter()
+                authentication().authenticate(request)
+                timings.append((time.perf_counter() - started) * 1e6)
+        self.stdout.write(
+            f'{name:<12} {percentile(timings, 50):>9.1f} '
+            f'{percentile(timings, 95):>9.1f} '
+            f'{len(queries) / repeat:>9.2f}'
+        )
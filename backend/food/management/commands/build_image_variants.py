@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from food.images import TARGETS, build_variants, is_stale
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные варианты картинок рецептов и аватарок, '
+        'у которых их нет или они устарели.'
+    )
+
+    def handle(self, *args, **options):
+        for model, target in TARGETS.items():
+            count = 0
+            for instance in model.objects.only(
+                'pk', target.image_field, target.variants_field
+            ).iterator():
+                if is_stale(instance):
+                    build_variants(model, instance.pk)
+                    count += 1
+            self.stdout.write(self.style.SUCCESS(
+                f'{model._meta.verbose_name_plural}: обработано {count}'
+            ))
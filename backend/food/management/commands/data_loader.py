@@ -1,15 +1,354 @@
+"""Потоковая загрузка справочников (ингредиенты, теги).
+
+Файлы JSON (массив объектов), JSONL и CSV читаются по частям, строки
+записываются пачками по --batch-size: существующие записи обновляются по
+уникальному ключу (bulk_create с update_conflicts), на PostgreSQL пачка
+передаётся через COPY во временную таблицу и переносится одним
+INSERT ... ON CONFLICT. Каждая пачка фиксируется отдельно, поэтому после
+ошибки загрузку можно просто повторить.
+
+Строки, которые нарушили бы другие уникальные ограничения модели
+(например, Tag.name при загрузке по slug), не записываются: команда
+сообщает о каждой такой строке, остальные загружаются.
+"""
+import csv
+import io
 import json
+import os
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+PROGRESS_INTERVAL = 2
+
+
+def read_json_array(file, fields):
+    """Объекты JSON-массива по одному, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        buffer = buffer[position:]
+        position = 0
+        chunk = file.read(CHUNK_SIZE)
+        buffer += chunk
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('Ожидался массив JSON.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item
+        if not chunk:
+            raise ValueError('Массив JSON не закрыт.')
+
+
+def read_jsonl(file, fields):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file, fields):
+    """Строки CSV; строка заголовка с именами полей пропускается."""
+    for row in csv.reader(file):
+        if not row or list(row) == list(fields):
+            continue
+        yield dict(zip(fields, row))
+
+
+READERS = {
+    'json': read_json_array,
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+
+class CatalogLoader:
+    """Пакетная запись строк в model с обновлением по unique_field."""
+
+    def __init__(self, model, unique_field, fields, batch_size=BATCH_SIZE,
+                 dry_run=False):
+        self.model = model
+        self.unique_field = unique_field
+        self.fields = fields
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.use_copy = connection.vendor == 'postgresql'
+
+    def load(self, rows, progress=None):
+        """
+        Загружает rows. Возвращает Counter: total — прочитано строк,
+        created и updated — новых и обновлённых записей, merged — строк,
+        замененных следующей строкой с тем же ключом в той же пачке,
+        conflicts — пропущенных строк (сами сообщения — в self.conflicts).
+        """
+        rows = iter(rows)
+        stats = Counter()
+        self.conflicts = []
+        number = 1
+        if self.use_copy and not self.dry_run:
+            self.create_staging_table()
+        try:
+            while batch := list(islice(rows, self.batch_size)):
+                size = len(batch)
+                batch = self.clean(batch, number)
+                number += size
+                stats['merged'] += size - len(batch)
+                batch = self.drop_conflicts(batch)
+                if batch:
+                    created, updated = self.write(
+                        [row for _, row in batch]
+                    )
+                    stats.update(created=created, updated=updated)
+                stats['total'] += size
+                if progress:
+                    progress(stats['total'])
+        finally:
+            if self.use_copy and not self.dry_run:
+                self.drop_staging_table()
+        stats['conflicts'] = len(self.conflicts)
+        return stats
 
+    def clean(self, batch, first_number):
+        """
+        Оставляет только поля модели и по одной строке на ключ (последнюю):
+        повтор ключа в одной пачке запрещён INSERT ... ON CONFLICT.
+        Возвращает пары (номер строки, строка).
+        """
+        unique = {}
+        for number, row in enumerate(batch, first_number):
+            if not isinstance(row, dict):
+                raise ValueError(f'Строка {number}: ожидался объект.')
+            missing = [field for field in self.fields if not row.get(field)]
+            if missing:
+                raise ValueError(
+                    f'Строка {number}: нет полей {", ".join(missing)}.'
+                )
+            key = str(row[self.unique_field]).strip()
+            unique.pop(key, None)
+            unique[key] = (number, {
+                field: str(row[field]).strip() for field in self.fields
+            })
+        return list(unique.values())
+
+    @property
+    def unique_sets(self):
+        """
+        Поля уникальных ограничений модели, кроме unique_field, которые
+        целиком входят в загружаемые поля.
+        """
+        options = self.model._meta
+        sets = [
+            (field.name,) for field in options.concrete_fields
+            if field.unique and not field.primary_key
+        ]
+        sets += [tuple(fields) for fields in options.unique_together]
+        sets += [
+            tuple(constraint.fields)
+            for constraint in options.total_unique_constraints
+        ]
+        return [
+            fields for fields in dict.fromkeys(sets)
+            if fields != (self.unique_field,)
+            and set(fields) <= set(self.fields)
+        ]
+
+    def drop_conflicts(self, batch):
+        """
+        Убирает из пачки строки, значения уникальных полей которых уже
+        заняты записью с другим ключом — в БД или выше в этой же пачке, —
+        и записывает о них сообщение в self.conflicts.
+        """
+        for fields in self.unique_sets:
+            first = fields[0]
+            taken = {
+                values[:-1]: values[-1]
+                for values in self.model.objects.filter(**{
+                    f'{first}__in': {row[first] for _, row in batch}
+                }).values_list(*fields, self.unique_field)
+            }
+            kept = []
+            for number, row in batch:
+                values = tuple(row[field] for field in fields)
+                owner = taken.setdefault(values, row[self.unique_field])
+                if owner == row[self.unique_field]:
+                    kept.append((number, row))
+                    continue
+                self.conflicts.append(
+                    f'Строка {number}: {", ".join(fields)} '
+                    f'{", ".join(values)} уже у записи '
+                    f'{self.unique_field}={owner}, строка пропущена.'
+                )
+            batch = kept
+        return batch
+
+    def write(self, batch):
+        """Записывает пачку, возвращает число новых и обновлённых записей."""
+        with transaction.atomic():
+            existing = self.model.objects.filter(**{
+                f'{self.unique_field}__in': [
+                    row[self.unique_field] for row in batch
+                ]
+            }).count()
+            if not self.dry_run:
+                if self.use_copy:
+                    self.copy(batch)
+                else:
+                    self.model.objects.bulk_create(
+                        [self.model(**row) for row in batch],
+                        update_conflicts=True,
+                        unique_fields=[self.unique_field],
+                        update_fields=[
+                            field for field in self.fields
+                            if field != self.unique_field
+                        ],
+                    )
+        return len(batch) - existing, existing
+
+    @property
+    def staging_table(self):
+        return f'{self.model._meta.db_table}_staging'
+
+    def create_staging_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE IF NOT EXISTS {self.staging_table} '
+                f'AS SELECT {", ".join(self.columns)} '
+                f'FROM {self.model._meta.db_table} WITH NO DATA'
+            )
+
+    def drop_staging_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.staging_table}')
+
+    @property
+    def columns(self):
+        return [
+            self.model._meta.get_field(field).column for field in self.fields
+        ]
+
+    def copy(self, batch):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in batch:
+            writer.writerow([row[field] for field in self.fields])
+        columns = ', '.join(self.columns)
+        unique_column = self.model._meta.get_field(self.unique_field).column
+        updates = ', '.join(
+            f'{column} = EXCLUDED.{column}'
+            for column in self.columns if column != unique_column
+        )
+        copy_sql = (
+            f'COPY {self.staging_table} ({columns}) FROM STDIN '
+            'WITH (FORMAT csv)'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.staging_table}')
+            raw_cursor = cursor.cursor
+            if hasattr(raw_cursor, 'copy_expert'):
+                # psycopg2
+                buffer.seek(0)
+                raw_cursor.copy_expert(copy_sql, buffer)
+            else:
+                # psycopg 3
+                with raw_cursor.copy(copy_sql) as copy:
+                    copy.write(buffer.getvalue())
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} ({columns}) '
+                f'SELECT {columns} FROM {self.staging_table} '
+                f'ON CONFLICT ({unique_column}) DO '
+                + (f'UPDATE SET {updates}' if updates else 'NOTHING')
+            )
+
+
+class CatalogCommand(BaseCommand):
+    """
+    Команда загрузки справочника model из файла. Подкласс задаёт model,
+    уникальное поле unique_field, поля fields (порядок колонок CSV) и
+    путь по умолчанию default_path.
+    """
+    model = None
+    unique_field = None
+    fields = ()
+    default_path = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=self.default_path,
+            help=f'Файл JSON, JSONL или CSV (по умолчанию '
+                 f'{self.default_path}).'
+        )
+        parser.add_argument(
+            '--format', choices=READERS,
+            help='Формат файла; по умолчанию — по расширению.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Прочитать и проверить файл, ничего не записывая.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(
+            path
+        )[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат {file_format}: укажите --format.'
+            )
+        loader = CatalogLoader(
+            self.model, self.unique_field, self.fields,
+            batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+        self.started = self.reported = time.monotonic()
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                stats = loader.load(
+                    READERS[file_format](file, self.fields), self.progress
+                )
+        except (OSError, ValueError, DatabaseError) as error:
+            raise CommandError(f'Ошибка загрузки {path}: {error}')
+        seconds = time.monotonic() - self.started
+        for conflict in loader.conflicts:
+            self.stderr.write(self.style.WARNING(conflict))
+        total = stats['total']
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверено" if options["dry_run"] else "Загружено"} '
+            f'{total} строк из {path}: новых {stats["created"]}, обновлено '
+            f'{stats["updated"]}, повторов ключа {stats["merged"]}, '
+            f'пропущено из-за конфликтов {stats["conflicts"]} за '
+            f'{seconds:.1f} с ({total / max(seconds, 1e-9):.0f} строк/с).'
+        ))
+        if not options['dry_run']:
+            self.after_load()
 
-def load_from_json(model, file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            object_to_create = [model(**item) for item in json.load(file)]
-            created_objects = model.objects.bulk_create(object_to_create,
-                                                        ignore_conflicts=True)
-            print(
-                f'Успешно загружено {len(created_objects)} объекта.'
+    def progress(self, total):
+        now = time.monotonic()
+        if now - self.reported >= PROGRESS_INTERVAL:
+            self.reported = now
+            self.stdout.write(
+                f'{total} строк, '
+                f'{total / (now - self.started):.0f} строк/с'
             )
 
-    except Exception as e:
-        print(f'Произошла ошибка при обработке файла {file_path}: {e}')
+    def after_load(self):
+        """Действия после успешной загрузки (сброс кешей и т. п.)."""
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from food.transfer import (BATCH_SIZE, IMAGE_WORKERS, Checkpoint,
+                           export_batches, export_image, export_record)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты в файл JSONL (формат описан в food.transfer). '
+        'Прерванная выгрузка продолжается с контрольной точки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL.')
+        parser.add_argument(
+            '--media-dir',
+            help='Скопировать картинки в этот каталог (пути в файле — '
+                 'относительно него).'
+        )
+        parser.add_argument(
+            '--embed-images', action='store_true',
+            help='Записать картинки в файл как data URI с base64.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--workers', type=int, default=IMAGE_WORKERS,
+            help='Потоков для копирования картинок.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию <path>.checkpoint).'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать заново, не используя контрольную точку.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['media_dir'] and options['embed_images']:
+            raise CommandError(
+                '--media-dir и --embed-images нельзя указать вместе.'
+            )
+        checkpoint = Checkpoint(
+            options['checkpoint'] or f'{path}.checkpoint'
+        )
+        state = None if options['restart'] else checkpoint.load()
+        if state:
+            self.stdout.write(
+                f'Продолжение после рецепта {state["last_id"]}, '
+                f'выгружено {state["exported"]}.'
+            )
+        else:
+            state = {'last_id': 0, 'offset': 0, 'exported': 0}
+        image = partial(
+            export_image, media_dir=options['media_dir'],
+            embed=options['embed_images']
+        )
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(options['workers']) as pool, open(
+                path, 'r+b' if state['offset'] else 'wb'
+            ) as file:
+                # Строки, записанные после контрольной точки, отбрасываются:
+                # их рецепты будут выгружены повторно.
+                file.seek(state['offset'])
+                file.truncate()
+                for batch in export_batches(
+                    state['last_id'], options['batch_size']
+                ):
+                    images = pool.map(
+                        image, [recipe.image.name for recipe in batch]
+                    )
+                    for recipe, value in zip(batch, images):
+                        file.write(json.dumps(
+                            export_record(recipe, value), ensure_ascii=False
+                        ).encode() + b'\n')
+                    file.flush()
+                    os.fsync(file.fileno())
+                    state = {
+                        'last_id': batch[-1].pk,
+                        'offset': file.tell(),
+                        'exported': state['exported'] + len(batch),
+                    }
+                    checkpoint.save(**state)
+                    self.stdout.write(f'Выгружено {state["exported"]}')
+        except (OSError, DatabaseError) as error:
+            raise CommandError(
+                f'Ошибка выгрузки: {error}. Повторный запуск продолжит '
+                f'с контрольной точки.'
+            )
+        checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {state["exported"]} в {path} за '
+            f'{time.monotonic() - started:.1f} с.'
+        ))
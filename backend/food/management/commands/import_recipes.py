@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from food.transfer import (BATCH_SIZE, IMAGE_WORKERS, Checkpoint,
+                           RecipeImporter)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из файла JSONL (формат описан в food.transfer). '
+        'Прерванная загрузка продолжается с контрольной точки, уже '
+        'загруженные рецепты пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL.')
+        parser.add_argument(
+            '--media-dir',
+            help='Каталог с картинками; без него пути картинок ищутся в '
+                 'хранилище MEDIA_ROOT.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--workers', type=int, default=IMAGE_WORKERS,
+            help='Потоков для сохранения картинок.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки (по умолчанию <path>.checkpoint).'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с начала файла, не используя контрольную точку.'
+        )
+        parser.add_argument(
+            '--skip-invalid', action='store_true',
+            help='Пропускать ошибочные строки вместо остановки.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = Checkpoint(
+            options['checkpoint'] or f'{path}.checkpoint'
+        )
+        state = None if options['restart'] else checkpoint.load()
+        if state:
+            self.stdout.write(f'Продолжение со строки {state["line"] + 1}.')
+        else:
+            state = {
+                'offset': 0, 'line': 0, 'imported': 0, 'existing': 0,
+                'invalid': 0, 'authors': [],
+            }
+        started = time.monotonic()
+        try:
+            with ThreadPoolExecutor(options['workers']) as pool, open(
+                path, 'rb'
+            ) as file:
+                importer = RecipeImporter(
+                    pool, options['media_dir'], options['skip_invalid']
+                )
+                importer.author_ids.update(state['authors'])
+                file.seek(state['offset'])
+                while lines := list(islice(file, options['batch_size'])):
+                    imported, existing = importer.import_batch(
+                        lines, state['line'] + 1
+                    )
+                    for error in importer.errors:
+                        self.stderr.write(error)
+                    state = {
+                        'offset': file.tell(),
+                        'line': state['line'] + len(lines),
+                        'imported': state['imported'] + imported,
+                        'existing': state['existing'] + existing,
+                        'invalid': state['invalid'] + len(importer.errors),
+                        'authors': sorted(importer.author_ids),
+                    }
+                    importer.errors.clear()
+                    checkpoint.save(**state)
+                    self.stdout.write(
+                        f'{state["line"]} строк: загружено '
+                        f'{state["imported"]}'
+                    )
+                importer.finish()
+        except (OSError, ValueError, DatabaseError) as error:
+            raise CommandError(
+                f'Ошибка загрузки {path}: {str(error).rstrip(".")}. '
+                f'Повторный запуск продолжит с контрольной точки.'
+            )
+        checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {state["imported"]}, уже было '
+            f'{state["existing"]}, пропущено ошибочных {state["invalid"]} '
+            f'за {time.monotonic() - started:.1f} с.'
+        ))
@@ -1,9 +1,17 @@
-from django.core.management.base import BaseCommand
+from django.db import transaction
 
-from food.models import Ingredient
-from .data_loader import load_from_json
+from food.ingredient_index import ingredient_index
+from food.models import ContentVersion, Ingredient
+from .data_loader import CatalogCommand
 
 
-class Command(BaseCommand):
-    def handle(self, *args, **options):
-        load_from_json(Ingredient, 'data/ingredients.json')
+class Command(CatalogCommand):
+    help = 'Загружает ингредиенты; существующие обновляются по названию.'
+    model = Ingredient
+    unique_field = 'name'
+    fields = ('name', 'measurement_unit')
+    default_path = 'data/ingredients.json'
+
+    def after_load(self):
+        ContentVersion.objects.bump('ingredient')
+        transaction.on_commit(ingredient_index.invalidate)
@@ -1,9 +1,17 @@
-from django.core.management.base import BaseCommand
+from django.db import transaction
 
-from food.models import Tag
-from .data_loader import load_from_json
+from food.models import ContentVersion, Tag
+from food.tag_map import tag_map
+from .data_loader import CatalogCommand
 
 
-class Command(BaseCommand):
-    def handle(self, *args, **options):
-        load_from_json(Tag, 'data/tags.json')
+class Command(CatalogCommand):
+    help = 'Загружает теги; существующие обновляются по слагу.'
+    model = Tag
+    unique_field = 'slug'
+    fields = ('slug', 'name')
+    default_path = 'data/tags.json'
+
+    def after_load(self):
+        ContentVersion.objects.bump('tag')
+        transaction.on_commit(tag_map.invalidate)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from food.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает материализованные суммы корзин покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='ID пользователя (можно указать несколько раз).',
+        )
+
+    def handle(self, *args, **options):
+        created = ShoppingCartTotal.objects.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано сумм ингредиентов: {created}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from food.feed import rebuild_timelines
+from food.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересоздаёт ленты подписок (TimelineEntry) по текущим подпискам.'
+
+    def handle(self, *args, **options):
+        rebuild_timelines()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        ))
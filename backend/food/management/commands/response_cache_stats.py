@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.response_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает попадания и промахи кеша ответов анонимным '
+        'пользователям и число инвалидаций по наборам данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики попаданий и промахов.'
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        requests = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / requests if requests else 0
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]} '
+            f'({ratio:.1%} попаданий)'
+        )
+        for name, count in stats['invalidations'].items():
+            self.stdout.write(f'Инвалидаций {name}: {count}')
+        if options['reset']:
+            reset_stats()
+            self.stdout.write('Счётчики обнулены.')
@@ -0,0 +1,276 @@
+import random
+import time
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+from food.counters import COUNTERS, repair
+from food.feed import rebuild_timelines
+from food.images import build_variants
+from food.models import (ContentVersion, Favorite, Ingredient,
+                         IngredientRecipe, Recipe, ShoppingCart,
+                         ShoppingCartTotal, Subscription, Tag, User)
+from food.search import rebuild_search_index
+from food.transfer import explicit_dates
+
+BATCH_SIZE = 5000
+PASSWORD = 'fake-password'
+WORDS = (
+    'суп', 'салат', 'пирог', 'запеканка', 'рагу', 'каша', 'омлет', 'паста',
+    'котлеты', 'блины', 'соус', 'десерт', 'домашний', 'быстрый', 'острый',
+    'сырный', 'овощной', 'куриный', 'грибной', 'летний', 'нарезать',
+    'обжарить', 'посолить', 'перемешать', 'запечь', 'варить', 'добавить',
+    'подавать', 'минут', 'до', 'готовности', 'на', 'среднем', 'огне',
+    'с', 'и', 'в', 'духовке', 'сковороде', 'кастрюле', 'зеленью', 'маслом',
+)
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей', 'Елена')
+LAST_NAMES = ('Иванова', 'Петров', 'Смирнова', 'Кузнецов', 'Попова')
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'), ('Обед', 'lunch'), ('Ужин', 'dinner'),
+    ('Десерт', 'dessert'), ('Выпечка', 'baking'),
+)
+DEFAULT_INGREDIENTS = 500
+
+
+class PowerLaw:
+    """
+    Выбор из items с вероятностью, убывающей как 1 / rank ** alpha:
+    немногие элементы (популярные рецепты, активные авторы) выбираются
+    часто, остальные — редко. Ранги раздаются в случайном порядке.
+    """
+
+    def __init__(self, items, alpha, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** alpha for rank in range(1, len(self.items) + 1)
+        ))
+        self.rng = rng
+
+    def sample(self, count):
+        return self.rng.choices(
+            self.items, cum_weights=self.cum_weights, k=count
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочных замеров: '
+        'пользователи, рецепты, избранное, корзины и подписки со '
+        'степенным распределением популярности, например '
+        '--users 100000 --recipes 1000000 --favorites 5000000. '
+        f'Пароль всех пользователей — {PASSWORD}.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--favorites', type=int, default=50000,
+            help='Сколько пар добавить в избранное; повторы пар '
+                 'отбрасываются, поэтому строк может оказаться меньше.'
+        )
+        parser.add_argument('--carts', type=int, default=10000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного распределения популярности.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Даты публикации рецептов — за последние N дней.'
+        )
+        parser.add_argument('--prefix', default='fake')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = time.monotonic()
+        alpha = options['alpha']
+        tag_ids = self.ensure_tags()
+        ingredients = PowerLaw(self.ensure_ingredients(), alpha, self.rng)
+        user_ids = self.create_users(options['users'], options['prefix'])
+        authors = PowerLaw(user_ids, alpha, self.rng)
+        image = self.create_image()
+        recipe_ids = self.create_recipes(
+            options['recipes'], authors, tag_ids, ingredients, image,
+            options['days']
+        )
+        readers = PowerLaw(user_ids, alpha, self.rng)
+        popular = PowerLaw(recipe_ids, alpha, self.rng)
+        for model, fields, count, subjects, objects, skip_self in (
+            (Favorite, ('user_id', 'recipe_id'), options['favorites'],
+             readers, popular, False),
+            (ShoppingCart, ('user_id', 'recipe_id'), options['carts'],
+             readers, popular, False),
+            # Популярные авторы — те же, что пишут больше всего рецептов.
+            (Subscription, ('subscriber_id', 'author_id'),
+             options['subscriptions'], readers, authors, True),
+        ):
+            self.create_pairs(
+                model, fields, count, subjects, objects, skip_self
+            )
+        self.rebuild_derived(recipe_ids, image)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - self.started:.0f} с.'
+        ))
+
+    def report(self, message):
+        self.stdout.write(
+            f'[{time.monotonic() - self.started:6.0f} с] {message}'
+        )
+
+    def batches(self, count):
+        for start in range(0, count, self.batch_size):
+            yield min(self.batch_size, count - start)
+
+    def words(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def ensure_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug) for name, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def ensure_ingredients(self):
+        """Ингредиенты из справочника или синтетические, если он пуст."""
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+                for number in range(1, DEFAULT_INGREDIENTS + 1)
+            )
+        return list(Ingredient.objects.values_list('pk', flat=True))
+
+    def create_users(self, count, prefix):
+        first = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(PASSWORD)
+        user_ids, number = [], first
+        for size in self.batches(count):
+            users = User.objects.bulk_create(
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    password=password,
+                )
+                for number in range(number, number + size)
+            )
+            number += size
+            user_ids.extend(user.pk for user in users)
+        self.report(f'Пользователей: {len(user_ids)}')
+        return user_ids
+
+    def create_image(self):
+        """Одна картинка на все рецепты: файлов не больше, чем нужно."""
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), (214, 150, 92)).save(buffer, 'JPEG')
+        return default_storage.save(
+            Recipe._meta.get_field('image').generate_filename(
+                None, 'fake.jpg'
+            ),
+            ContentFile(buffer.getvalue())
+        )
+
+    def create_recipes(self, count, authors, tag_ids, ingredients, image,
+                       days):
+        now = timezone.now()
+        recipe_ids = []
+        for size in self.batches(count):
+            recipes = []
+            for author_id in authors.sample(size):
+                created_at = now - timedelta(
+                    seconds=self.rng.randint(0, days * 24 * 60 * 60)
+                )
+                recipes.append(Recipe(
+                    author_id=author_id,
+                    name=self.words(2, 5).capitalize(),
+                    text=self.words(20, 80).capitalize(),
+                    cooking_time=self.rng.randint(5, 180),
+                    image=image,
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+            with explicit_dates(Recipe):
+                recipes = Recipe.objects.bulk_create(recipes)
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in set(
+                    ingredients.sample(self.rng.randint(3, 12))
+                )
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in self.rng.sample(
+                    tag_ids, self.rng.randint(1, min(3, len(tag_ids)))
+                )
+            )
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+            self.report(f'Рецептов: {len(recipe_ids)}')
+        return recipe_ids
+
+    def create_pairs(
+        self, model, fields, count, subjects, objects, skip_self=False
+    ):
+        """
+        Связи subject — object; повторы отбрасываются, а с skip_self —
+        и связи с собой (id пользователя и рецепта из разных таблиц и
+        могут совпадать, поэтому для избранного их не сравнивают).
+        """
+        before = model.objects.count()
+        for size in self.batches(count):
+            pairs = {
+                pair for pair in zip(
+                    subjects.sample(size), objects.sample(size)
+                )
+                if not skip_self or pair[0] != pair[1]
+            }
+            model.objects.bulk_create(
+                (model(**dict(zip(fields, pair))) for pair in pairs),
+                ignore_conflicts=True,
+            )
+        self.report(
+            f'{model._meta.verbose_name_plural}: '
+            f'{model.objects.count() - before}'
+        )
+
+    def rebuild_derived(self, recipe_ids, image):
+        """
+        Пересчитывает то, что при поштучной записи делают сигналы:
+        счётчики, суммы корзин, поисковый индекс, ленты и варианты
+        картинки (общие для всех рецептов, строятся один раз).
+        """
+        for counter in COUNTERS:
+            repair(counter)
+        self.report('Счётчики пересчитаны')
+        ShoppingCartTotal.objects.rebuild()
+        self.report('Суммы корзин пересчитаны')
+        rebuild_search_index()
+        self.report('Поисковый индекс построен')
+        rebuild_timelines()
+        self.report('Ленты построены')
+        if recipe_ids:
+            build_variants(Recipe, recipe_ids[0])
+            Recipe.objects.filter(image=image).update(
+                image_variants=Recipe.objects.get(
+                    pk=recipe_ids[0]
+                ).image_variants
+            )
+        ContentVersion.objects.bump('tag', 'ingredient', 'recipe', 'user')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from food.counters import COUNTERS, drifted, repair
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет денормализованные счётчики и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения и завершиться с ошибкой, '
+                 'если они есть.',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for counter in COUNTERS:
+            label = f'{counter.target.__name__}.{counter.field}'
+            if options['check']:
+                count = drifted(counter).count()
+            else:
+                count = repair(counter)
+            total += count
+            self.stdout.write(f'{label}: {count}')
+        if options['check'] and total:
+            raise CommandError(f'Найдено расхождений: {total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено расхождений: {total}' if not options['check']
+            else 'Расхождений нет.'
+        ))
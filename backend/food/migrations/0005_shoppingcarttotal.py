@@ -0,0 +1,51 @@
+# Generated by Django 4.2.21 on 2026-10-17 04:19
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+import django.db.models.deletion
+
+
+def fill_totals(apps, schema_editor):
+    ShoppingCart = apps.get_model('food', 'ShoppingCart')
+    ShoppingCartTotal = apps.get_model('food', 'ShoppingCartTotal')
+    ShoppingCartTotal.objects.bulk_create(
+        ShoppingCartTotal(**row)
+        for row in ShoppingCart.objects.filter(
+            recipe__recipe_ingredients__isnull=False
+        ).values('user_id').annotate(
+            ingredient_id=F('recipe__recipe_ingredients__ingredient_id'),
+            amount=Sum('recipe__recipe_ingredients__amount'),
+            recipes_count=Count('recipe_id'),
+        ).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0004_engagement_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(default=0, verbose_name='Количество')),
+                ('recipes_count', models.IntegerField(default=0, verbose_name='Рецептов')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='food.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Сумма корзины',
+                'verbose_name_plural': 'Суммы корзин',
+                'default_related_name': 'shopping_cart_totals',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcarttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_ingredient_total'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
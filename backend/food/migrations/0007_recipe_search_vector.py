@@ -0,0 +1,64 @@
+# Generated by Django 4.2.21 on 2026-10-17 04:23
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+INGREDIENT_NAMES = {
+    'postgresql': "string_agg(i.name, ' ')",
+    'sqlite': "group_concat(i.name, ' ')",
+}
+RECIPE_INGREDIENT_NAMES = (
+    'COALESCE((SELECT {aggregate} FROM food_ingredientrecipe ir '
+    'JOIN food_ingredient i ON i.id = ir.ingredient_id '
+    "WHERE ir.recipe_id = r.id), '')"
+)
+FORWARD_SQL = {
+    'postgresql': (
+        'CREATE INDEX recipe_search_vector_idx ON food_recipe '
+        'USING gin (search_vector)',
+        'UPDATE food_recipe r SET search_vector = '
+        "setweight(to_tsvector('russian', r.name), 'A') || "
+        "setweight(to_tsvector('russian', {names}), 'B') || "
+        "setweight(to_tsvector('russian', r.text), 'C')",
+    ),
+    'sqlite': (
+        'CREATE VIRTUAL TABLE food_recipe_fts USING fts5('
+        "name, text, ingredients, tokenize='unicode61 remove_diacritics 2')",
+        'INSERT INTO food_recipe_fts (rowid, name, text, ingredients) '
+        'SELECT r.id, r.name, r.text, {names} FROM food_recipe r',
+    ),
+}
+BACKWARD_SQL = {
+    'postgresql': ('DROP INDEX IF EXISTS recipe_search_vector_idx',),
+    'sqlite': ('DROP TABLE IF EXISTS food_recipe_fts',),
+}
+
+
+def run_vendor_sql(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        names = RECIPE_INGREDIENT_NAMES.format(
+            aggregate=INGREDIENT_NAMES.get(vendor)
+        )
+        for statement in statements.get(vendor, ()):
+            schema_editor.execute(statement.format(names=names))
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0006_user_shopping_cart_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.RunPython(
+            run_vendor_sql(FORWARD_SQL), run_vendor_sql(BACKWARD_SQL)
+        ),
+    ]
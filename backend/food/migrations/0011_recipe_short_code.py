@@ -0,0 +1,43 @@
+# Generated by Django 4.2.21 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from shortuuid import ShortUUID
+
+SHORT_CODE_LENGTH = 8
+BATCH_SIZE = 1000
+
+
+def fill_short_codes(apps, schema_editor):
+    Recipe = apps.get_model('food', 'Recipe')
+    generator = ShortUUID()
+    used = set()
+    recipes = Recipe.objects.filter(short_code__isnull=True).only('pk')
+    while batch := list(recipes[:BATCH_SIZE]):
+        for recipe in batch:
+            code = generator.random(length=SHORT_CODE_LENGTH)
+            while code.isdigit() or code in used:
+                code = generator.random(length=SHORT_CODE_LENGTH)
+            used.add(code)
+            recipe.short_code = code
+        Recipe.objects.bulk_update(batch, ['short_code'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0010_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='short_code',
+            field=models.CharField(editable=False, max_length=8, null=True, verbose_name='Код короткой ссылки'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='short_link_clicks',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Переходы по короткой ссылке'),
+        ),
+        migrations.RunPython(fill_short_codes, migrations.RunPython.noop),
+    ]
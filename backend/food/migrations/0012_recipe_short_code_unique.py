@@ -0,0 +1,20 @@
+# Generated by Django 4.2.21 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+import food.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0011_recipe_short_code'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_code',
+            field=models.CharField(default=food.models.generate_short_code, editable=False, max_length=8, unique=True, verbose_name='Код короткой ссылки'),
+        ),
+    ]
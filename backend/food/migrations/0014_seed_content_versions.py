@@ -0,0 +1,24 @@
+# Generated by Django 4.2.21 on 2026-10-17 11:20
+
+from django.db import migrations
+
+CONTENT_VERSIONS = ('recipe', 'tag', 'ingredient', 'user')
+
+
+def seed_content_versions(apps, schema_editor):
+    ContentVersion = apps.get_model('food', 'ContentVersion')
+    ContentVersion.objects.bulk_create(
+        (ContentVersion(name=name) for name in CONTENT_VERSIONS),
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0013_recipe_author_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_content_versions, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,45 @@
+from itertools import islice
+
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.utils import timezone
+from shortuuid import ShortUUID
 
 from .constants import (COOKING_TIME_MIN_VALUE, EMAIL_MAX_LENGTH,
                         FIRST_NAME_MAX_LENGTH, INGREDIENT_AMOUNT_MIN_VALUE,
-                        LAST_NAME_MAX_LENGTH, USERNAME_MAX_LENGTH)
-
-
-class User(AbstractUser):
+                        LAST_NAME_MAX_LENGTH, SHORT_CODE_ATTEMPTS,
+                        SHORT_CODE_LENGTH, USERNAME_MAX_LENGTH)
+
+
+class CounterFieldsMixin:
+    """
+    Поля counter_fields меняются только атомарными UPDATE с F()
+    (food.counters), поэтому сохранение всего объекта их не записывает:
+    иначе значения, прочитанные при загрузке объекта, затёрли бы
+    изменения, сделанные после неё.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not args
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
 
     email = models.EmailField(
         verbose_name='Email',
@@ -50,6 +81,35 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    avatar_variants = models.JSONField(
+        verbose_name='Варианты аватарки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Подписок',
+        default=0,
+        editable=False,
+    )
+    shopping_cart_version = models.PositiveIntegerField(
+        verbose_name='Версия корзины',
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ('recipes_count', 'followers_count', 'following_count',
+                      'shopping_cart_version')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'last_name', 'first_name']
@@ -134,7 +194,18 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+def generate_short_code():
+    """
+    Случайный код короткой ссылки. Коды из одних цифр не выдаются: такие
+    адреса /s/<id>/ заняты ссылками по id рецепта.
+    """
+    while True:
+        code = ShortUUID().random(length=SHORT_CODE_LENGTH)
+        if not code.isdigit():
+            return code
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецептров."""
     author = models.ForeignKey(
         User,
@@ -149,6 +220,12 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         verbose_name='Картинка',
     )
+    image_variants = models.JSONField(
+        verbose_name='Варианты картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание',
     )
@@ -173,16 +250,80 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
+    short_code = models.CharField(
+        verbose_name='Код короткой ссылки',
+        max_length=SHORT_CODE_LENGTH,
+        unique=True,
+        default=generate_short_code,
+        editable=False,
+    )
+    short_link_clicks = models.PositiveIntegerField(
+        verbose_name='Переходы по короткой ссылке',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый индекс',
+        null=True,
+        editable=False,
+    )
+
+    counter_fields = ('favorites_count', 'shopping_cart_count',
+                      'short_link_clicks')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
         ordering = ('-created_at',)
+        indexes = (
+            models.Index(
+                fields=('-created_at', '-id'),
+                name='recipe_created_at_id_idx'
+            ),
+            # Рецепты автора (?author=) в порядке ленты без сортировки.
+            models.Index(
+                fields=('author', '-created_at', '-id'),
+                name='recipe_author_created_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}'
 
+    def save(self, *args, **kwargs):
+        """
+        Если код короткой ссылки нового рецепта уже занят, рецепт
+        сохраняется с новым кодом — до SHORT_CODE_ATTEMPTS попыток.
+        """
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        for attempt in range(1, SHORT_CODE_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = Recipe.objects.filter(
+                    short_code=self.short_code
+                ).exists()
+                if not taken or attempt == SHORT_CODE_ATTEMPTS:
+                    raise
+                self.short_code = generate_short_code()
+
 
 class IngredientRecipe(models.Model):
     recipe = models.ForeignKey(
@@ -252,3 +393,281 @@ class ShoppingCart(BaseFavoriteShoppingCart):
     class Meta(BaseFavoriteShoppingCart.Meta):
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
+
+
+class ShoppingCartTotalManager(models.Manager):
+    BATCH_SIZE = 1000
+
+    def apply(self, user_ids, deltas):
+        """
+        Применяет изменения к суммам корзин пользователей user_ids.
+
+        deltas: {ingredient_id: (изменение количества,
+                                 изменение числа рецептов)}.
+        """
+        user_ids = list(user_ids)
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            self.bump_versions(user_ids)
+            self._bulk_create(
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id in deltas
+            )
+            totals = self.filter(user_id__in=user_ids)
+            totals.filter(ingredient_id__in=deltas).update(
+                amount=F('amount') + self._delta_case(deltas, 0),
+                recipes_count=F('recipes_count') + self._delta_case(
+                    deltas, 1
+                ),
+            )
+            totals.filter(recipes_count__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        """Добавляет (sign=1) или убирает (sign=-1) рецепт из сумм."""
+        self.apply([user_id], {
+            ingredient_id: (sign * amount, sign)
+            for ingredient_id, amount in IngredientRecipe.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', 'amount')
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """
+        Переносит изменение ингредиентов рецепта в суммы всех корзин,
+        где он лежит. old_amounts и new_amounts: {ingredient_id: amount}.
+        """
+        deltas = {}
+        for ingredient_id in old_amounts.keys() | new_amounts.keys():
+            old = old_amounts.get(ingredient_id)
+            new = new_amounts.get(ingredient_id)
+            if old == new:
+                continue
+            deltas[ingredient_id] = (
+                (new or 0) - (old or 0),
+                (new is not None) - (old is not None),
+            )
+        if deltas:
+            self.apply(
+                ShoppingCart.objects.filter(
+                    recipe=recipe
+                ).values_list('user_id', flat=True),
+                deltas
+            )
+
+    def rebuild(self, user_ids=None):
+        """Пересчитывает суммы с нуля (для всех или для user_ids)."""
+        totals, carts = self.all(), ShoppingCart.objects.all()
+        if user_ids is not None:
+            totals = totals.filter(user_id__in=user_ids)
+            carts = carts.filter(user_id__in=user_ids)
+        with transaction.atomic():
+            self.bump_versions(user_ids)
+            totals.delete()
+            return self._bulk_create(
+                self.model(
+                    user_id=row['user_id'],
+                    ingredient_id=row['ingredient_id'],
+                    amount=row['amount'],
+                    recipes_count=row['recipes_count'],
+                )
+                for row in carts.filter(
+                    recipe__recipe_ingredients__isnull=False
+                ).values('user_id').annotate(
+                    ingredient_id=F(
+                        'recipe__recipe_ingredients__ingredient_id'
+                    ),
+                    amount=Sum('recipe__recipe_ingredients__amount'),
+                    recipes_count=Count('recipe_id'),
+                ).order_by().iterator()
+            )
+
+    @staticmethod
+    def bump_versions(user_ids=None):
+        """
+        Увеличивает User.shopping_cart_version — ключ кеша выгрузки списка
+        покупок (для всех пользователей, если user_ids не задан).
+        """
+        users = User.objects.all()
+        if user_ids is not None:
+            users = users.filter(pk__in=user_ids)
+        users.update(shopping_cart_version=F('shopping_cart_version') + 1)
+
+    def _bulk_create(self, objects):
+        created = 0
+        while batch := list(islice(objects, self.BATCH_SIZE)):
+            self.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        return created
+
+    @staticmethod
+    def _delta_case(deltas, index):
+        return Case(
+            *(
+                When(ingredient_id=ingredient_id, then=Value(delta[index]))
+                for ingredient_id, delta in deltas.items()
+            ),
+            default=Value(0),
+        )
+
+
+class ShoppingCartTotal(models.Model):
+    """
+    Материализованные суммы ингредиентов в корзине пользователя.
+
+    Обновляются при добавлении/удалении рецепта из корзины и при изменении
+    ингредиентов рецепта, лежащего в корзинах; rebuild_shopping_totals
+    пересчитывает их с нуля.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество',
+    )
+    recipes_count = models.IntegerField(
+        default=0,
+        verbose_name='Рецептов',
+    )
+
+    objects = ShoppingCartTotalManager()
+
+    class Meta:
+        verbose_name = 'Сумма корзины'
+        verbose_name_plural = 'Суммы корзин'
+        default_related_name = 'shopping_cart_totals'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_total'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}: {self.amount}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Рецепт в ленте подписок пользователя (food.feed). Строки создаются
+    для каждого подписчика автора при публикации рецепта, добавляются при
+    подписке и удаляются при отписке.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        default_related_name = 'timeline_entries'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_user_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-created_at', '-recipe'),
+                name='timeline_user_created_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class ContentVersionManager(models.Manager):
+
+    def bump(self, *names):
+        """
+        Увеличивает версии names после фиксации текущей транзакции, чтобы
+        читатели не закешировали новую версию со старыми данными.
+        """
+        transaction.on_commit(lambda: self._bump(names))
+
+    def _bump(self, names):
+        # Строки версий создаёт миграция; если строки нет, её могут
+        # одновременно создавать несколько процессов — проигравший
+        # увеличивает версию уже созданной строки.
+        now = timezone.now()
+        for name in names:
+            versions = self.filter(name=name)
+            if versions.update(version=F('version') + 1, updated_at=now):
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(name=name, version=1, updated_at=now)
+            except IntegrityError:
+                versions.update(version=F('version') + 1, updated_at=now)
+
+    def get_versions(self, *names):
+        """{name: (версия, время изменения)} одним запросом."""
+        versions = dict.fromkeys(names, (0, None))
+        versions.update(
+            (name, (version, updated_at))
+            for name, version, updated_at in self.filter(
+                name__in=names
+            ).values_list('name', 'version', 'updated_at')
+        )
+        return versions
+
+
+class ContentVersion(models.Model):
+    """
+    Счётчик версии набора данных (таблицы): увеличивается при любом
+    изменении и служит для ETag/Last-Modified и ключей кеша, не требуя
+    чтения самих таблиц.
+    """
+    name = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Набор данных',
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Версия',
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата изменения',
+    )
+
+    objects = ContentVersionManager()
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
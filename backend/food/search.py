@@ -0,0 +1,159 @@
+"""Полнотекстовый поиск рецептов по названию, описанию и ингредиентам.
+
+На PostgreSQL индекс — колонка Recipe.search_vector (tsvector с
+русской морфологией, GIN-индекс), ранжирование — ts_rank. На SQLite
+(USE_SQLITE) — теневая таблица FTS5 с ранжированием bm25; морфологии в
+FTS5 нет, поэтому слова запроса усекаются до основы и ищутся по префиксу.
+
+Индекс обновляется явно (update_search_index) после записи рецепта и его
+ингредиентов, а rebuild_search_index пересоздаёт его целиком.
+"""
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .models import IngredientRecipe, Recipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'food_recipe_fts'
+# Веса bm25 для колонок name, text, ingredients таблицы FTS5.
+FTS_WEIGHTS = (10.0, 1.0, 4.0)
+RUSSIAN_ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'иях', 'ах',
+    'ях', 'ов', 'ев', 'ей', 'ой', 'ый', 'ий', 'ая', 'яя', 'ое', 'ее',
+    'ые', 'ие', 'ом', 'ем', 'ам', 'ям', 'ую', 'юю', 'а', 'я', 'ы', 'и',
+    'о', 'е', 'у', 'ю', 'ь',
+), key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+
+def is_postgresql():
+    return connection.vendor == 'postgresql'
+
+
+def recipe_search_vector():
+    # Агрегаты contrib.postgres требуют psycopg, поэтому импортируются только
+    # при работе с PostgreSQL.
+    from django.contrib.postgres.aggregates import StringAgg
+
+    ingredient_names = Subquery(
+        IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(ingredient_names, Value('')),
+            weight='B', config=SEARCH_CONFIG
+        )
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_index(recipe_ids):
+    """Обновляет индекс для рецептов recipe_ids (список или queryset)."""
+    if is_postgresql():
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=recipe_search_vector()
+        )
+        return
+    recipes = {
+        pk: (name, text, [])
+        for pk, name, text in Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).values_list('pk', 'name', 'text')
+    }
+    for recipe_id, ingredient_name in IngredientRecipe.objects.filter(
+        recipe_id__in=recipes
+    ).values_list('recipe_id', 'ingredient__name'):
+        recipes[recipe_id][2].append(ingredient_name)
+    remove_from_search_index(recipes)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+            'VALUES (%s, %s, %s, %s)',
+            [
+                (pk, name, text, ' '.join(ingredients))
+                for pk, (name, text, ingredients) in recipes.items()
+            ]
+        )
+
+
+def remove_from_search_index(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if is_postgresql() or not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+            f'({", ".join(["%s"] * len(recipe_ids))})',
+            recipe_ids
+        )
+
+
+def rebuild_search_index(batch_size=1000):
+    """Пересоздаёт индекс всех рецептов, возвращает их число."""
+    if not is_postgresql():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+    for start in range(0, len(recipe_ids), batch_size):
+        update_search_index(recipe_ids[start:start + batch_size])
+    return len(recipe_ids)
+
+
+def stem(word):
+    for ending in RUSSIAN_ENDINGS:
+        if (
+            word.endswith(ending)
+            and len(word) - len(ending) >= MIN_STEM_LENGTH
+        ):
+            return word[:-len(ending)]
+    return word
+
+
+def fts_match_query(query):
+    """Запрос MATCH для FTS5: все слова запроса по префиксу основы."""
+    return ' '.join(
+        f'"{stem(word)}"*' for word in re.findall(r'\w+', query.lower())
+    )
+
+
+def search_recipes(recipes, query):
+    """
+    Фильтрует queryset рецептов по поисковому запросу и добавляет
+    аннотацию search_rank; сортирует по убыванию релевантности.
+    """
+    if is_postgresql():
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        recipes = recipes.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        )
+    else:
+        match = fts_match_query(query)
+        if not match:
+            return recipes.none()
+        recipes = recipes.filter(Q(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        ))).annotate(search_rank=RawSQL(
+            # Ранги считаются одним проходом по индексу: без MATERIALIZED
+            # SQLite выполняет MATCH заново для каждого найденного рецепта.
+            f'WITH ranked AS MATERIALIZED (SELECT rowid AS id, '
+            f'-bm25({FTS_TABLE}, {", ".join(map(str, FTS_WEIGHTS))}) '
+            f'AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) '
+            f'SELECT rank FROM ranked '
+            f'WHERE ranked.id = {Recipe._meta.db_table}.id',
+            (match,)
+        ))
+    return recipes.order_by('-search_rank', '-created_at', '-id')
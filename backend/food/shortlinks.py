@@ -0,0 +1,145 @@
+"""Короткие ссылки /s/<код>/ без запросов к БД на каждый переход.
+
+Карта «код → id рецепта» хранится в памяти процесса: она строится при
+запуске рабочего процесса (foodgram_backend.wsgi) и пополняется сигналами
+при создании и удалении рецептов. Рецепты, созданные в другом процессе
+или через bulk_create, находятся запросом к БД при первом переходе и
+добавляются в карту. Неизвестные коды и id тоже запоминаются — на
+MISS_TTL секунд, чтобы переходы по несуществующим ссылкам не обращались
+к БД каждый раз; таких записей хранится не больше MISS_CACHE_SIZE.
+
+Переходы копятся в памяти и записываются в Recipe.short_link_clicks
+пачкой, когда накопится CLICK_FLUSH_SIZE переходов или пройдёт
+CLICK_FLUSH_INTERVAL секунд с прошлой записи (проверяется при очередном
+переходе), а также при завершении процесса.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+from .models import Recipe
+
+CLICK_FLUSH_SIZE = 100
+CLICK_FLUSH_INTERVAL = 10
+MISS_TTL = 30
+MISS_CACHE_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class ShortLinks:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.codes = None
+        self.ids = None
+        self.misses = {}
+        self.clicks = Counter()
+        self.pending = 0
+        self.flushed_at = time.monotonic()
+
+    def warm(self):
+        codes = dict(
+            Recipe.objects.values_list('short_code', 'pk').iterator()
+        )
+        with self.lock:
+            self.codes = codes
+            self.ids = set(codes.values())
+
+    def add(self, code, recipe_id):
+        with self.lock:
+            self.misses.pop(('code', code), None)
+            self.misses.pop(('id', recipe_id), None)
+            if self.codes is not None:
+                self.codes[code] = recipe_id
+                self.ids.add(recipe_id)
+
+    def remove(self, code, recipe_id):
+        with self.lock:
+            if self.codes is not None:
+                self.codes.pop(code, None)
+                self.ids.discard(recipe_id)
+
+    def is_missing(self, key):
+        expires_at = self.misses.get(key)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def add_miss(self, key):
+        with self.lock:
+            if len(self.misses) >= MISS_CACHE_SIZE:
+                self.misses.clear()
+            self.misses[key] = time.monotonic() + MISS_TTL
+
+    def resolve(self, code):
+        """id рецепта по коду ссылки или None."""
+        if self.codes is None:
+            self.warm()
+        recipe_id = self.codes.get(code)
+        if recipe_id is None and not self.is_missing(('code', code)):
+            recipe_id = Recipe.objects.filter(short_code=code).values_list(
+                'pk', flat=True
+            ).first()
+            if recipe_id is None:
+                self.add_miss(('code', code))
+            else:
+                self.add(code, recipe_id)
+        return recipe_id
+
+    def exists(self, recipe_id):
+        """Есть ли рецепт с таким id (для ссылок /s/<id>/)."""
+        if self.ids is None:
+            self.warm()
+        if recipe_id in self.ids:
+            return True
+        if self.is_missing(('id', recipe_id)):
+            return False
+        code = Recipe.objects.filter(pk=recipe_id).values_list(
+            'short_code', flat=True
+        ).first()
+        if code is None:
+            self.add_miss(('id', recipe_id))
+            return False
+        self.add(code, recipe_id)
+        return True
+
+    def click(self, recipe_id):
+        with self.lock:
+            self.clicks[recipe_id] += 1
+            self.pending += 1
+            due = (
+                self.pending >= CLICK_FLUSH_SIZE
+                or time.monotonic() - self.flushed_at >= CLICK_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Записывает накопленные переходы: по UPDATE на каждое их число."""
+        with self.lock:
+            clicks, self.clicks = self.clicks, Counter()
+            self.pending = 0
+            self.flushed_at = time.monotonic()
+        if not clicks:
+            return
+        recipe_ids = {}
+        for recipe_id, count in clicks.items():
+            recipe_ids.setdefault(count, []).append(recipe_id)
+        try:
+            with transaction.atomic():
+                for count, ids in recipe_ids.items():
+                    Recipe.objects.filter(pk__in=ids).update(
+                        short_link_clicks=F('short_link_clicks') + count
+                    )
+        except DatabaseError:
+            logger.exception('Не удалось записать переходы по ссылкам')
+            with self.lock:
+                self.clicks.update(clicks)
+                self.pending += sum(clicks.values())
+
+
+short_links = ShortLinks()
+atexit.register(short_links.flush)
@@ -0,0 +1,226 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from jobs.registry import enqueue
+
+from . import feed
+from .constants import FEED_FANOUT_MAX_FOLLOWERS
+from .counters import change_counters
+from .images import is_stale, schedule_delete, schedule_variants
+from .ingredient_index import ingredient_index
+from .models import (ContentVersion, Favorite, Ingredient, IngredientRecipe,
+                     Recipe, ShoppingCart, ShoppingCartTotal, Subscription,
+                     Tag)
+from .search import remove_from_search_index, update_search_index
+from .shortlinks import short_links
+from .tag_map import tag_map
+
+User = get_user_model()
+
+# Поля пользователя, которые выводятся в ответах с рецептами (автор).
+USER_PUBLIC_FIELDS = ('email', 'username', 'first_name', 'last_name',
+                      'avatar')
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def increment_counters(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        change_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def decrement_counters(sender, instance, **kwargs):
+    change_counters(instance, -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_cart_totals(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        ShoppingCartTotal.objects.add_recipe(
+            instance.user_id, instance.recipe_id
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_cart_totals(sender, instance, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его ингредиенты
+    # к post_delete уже удалены.
+    ShoppingCartTotal.objects.add_recipe(
+        instance.user_id, instance.recipe_id, sign=-1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def bump_shopping_cart_versions(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        ShoppingCartTotal.objects.bump_versions(
+            instance.shoppingcarts.values('user_id')
+        )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    # После фиксации: иначе параллельный запрос может перестроить индекс
+    # по ещё не зафиксированным (или откаченным) данным под новой версией.
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_map(sender, **kwargs):
+    # После фиксации — как invalidate_ingredient_index.
+    transaction.on_commit(tag_map.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        update_search_index(IngredientRecipe.objects.filter(
+            ingredient=instance
+        ).values('recipe_id'))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_search_index(sender, instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def add_short_link(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        transaction.on_commit(
+            lambda: short_links.add(instance.short_code, instance.pk)
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_short_link(sender, instance, **kwargs):
+    # После фиксации: до неё рецепт ещё виден в БД и запрос по промаху
+    # карты вернул бы его обратно.
+    recipe_id = instance.pk
+    transaction.on_commit(
+        lambda: short_links.remove(instance.short_code, recipe_id)
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_content_version(sender, **kwargs):
+    ContentVersion.objects.bump(sender._meta.model_name)
+
+
+@receiver(pre_save, sender=User)
+def check_user_public_fields(sender, instance, raw, update_fields=None,
+                             **kwargs):
+    """
+    Запоминает, меняются ли поля автора, которые видны в ответах с
+    рецептами: от версии 'user' зависят только они.
+    """
+    fields = [
+        field for field in USER_PUBLIC_FIELDS
+        if update_fields is None or field in update_fields
+    ]
+    instance.public_fields_changed = bool(fields)
+    if raw or instance._state.adding or not fields:
+        return
+    saved = User.objects.filter(pk=instance.pk).values(*fields).first()
+    instance.public_fields_changed = saved is None or any(
+        field.get_prep_value(field.value_from_object(instance))
+        != saved[field.name]
+        for field in map(sender._meta.get_field, fields)
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_user_version(sender, instance, created, **kwargs):
+    # Новый пользователь ещё не автор рецептов, а вход сохраняет только
+    # last_login — закешированные ответы от этого не меняются.
+    if not created and getattr(instance, 'public_fields_changed', True):
+        ContentVersion.objects.bump('user')
+
+
+@receiver(post_delete, sender=User)
+def bump_user_version_on_delete(sender, **kwargs):
+    ContentVersion.objects.bump('user')
+
+
+@receiver(post_save, sender=IngredientRecipe)
+@receiver(post_delete, sender=IngredientRecipe)
+def touch_recipe_on_ingredients_change(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        updated_at=timezone.now()
+    )
+    ContentVersion.objects.bump('recipe')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipe_on_tags_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if reverse and action == 'pre_clear':
+        recipes = Recipe.objects.filter(tags=instance)
+    elif reverse and action in ('post_add', 'post_remove'):
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    elif not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        recipes = Recipe.objects.filter(pk=instance.pk)
+    else:
+        return
+    recipes.update(updated_at=timezone.now())
+    ContentVersion.objects.bump('recipe')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def build_image_variants(sender, instance, raw, **kwargs):
+    if not raw and is_stale(instance):
+        schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image_variants(sender, instance, **kwargs):
+    schedule_delete(instance.image_variants)
+
+
+@receiver(post_delete, sender=User)
+def delete_avatar_variants(sender, instance, **kwargs):
+    schedule_delete(instance.avatar_variants)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        enqueue('food.fan_out_recipe', recipe_id=instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_timeline(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        feed.backfill(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def trim_timeline(sender, instance, **kwargs):
+    feed.trim(instance.subscriber_id, instance.author_id)
+    # Счётчик уже уменьшен в decrement_counters: если подписчиков стало
+    # ровно FEED_FANOUT_MAX_FOLLOWERS, рецепты автора снова раскладываются
+    # по лентам, а не подмешиваются при запросе, и ленты его подписчиков
+    # нужно дополнить.
+    if User.objects.filter(
+        pk=instance.author_id, followers_count=FEED_FANOUT_MAX_FOLLOWERS
+    ).exists():
+        enqueue('food.backfill_followers', author_ids=[instance.author_id])
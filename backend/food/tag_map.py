@@ -0,0 +1,61 @@
+"""Слаги тегов в памяти процесса для фильтра рецептов по тегам.
+
+Тегов единицы, а фильтр ?tags= приходит почти в каждом запросе списка
+рецептов, поэтому слаги сопоставляются с id по словарю в памяти, без
+запроса к Tag. Словарь перестраивается лениво: после сохранения/удаления
+Tag и после load_tags (invalidate меняет версию в кеше — при общем кеше
+это видят все процессы), а также не реже раза в MAP_TTL секунд.
+"""
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+
+from .models import Tag
+
+MAP_TTL = 60
+VERSION_CACHE_KEY = 'tag_map_version'
+
+MapState = namedtuple('MapState', ('ids', 'version', 'built_at'))
+
+
+class TagMap:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+
+    def invalidate(self):
+        """Сбрасывает словарь в этом процессе и его версию в кеше."""
+        cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        self.state = None
+
+    def choices(self):
+        return [(slug, slug) for slug in self.get_state().ids]
+
+    def get_ids(self, slugs):
+        """id тегов по слагам; неизвестные слаги пропускаются."""
+        ids = self.get_state().ids
+        return [ids[slug] for slug in slugs if slug in ids]
+
+    def get_state(self):
+        state = self.state
+        version = cache.get(VERSION_CACHE_KEY)
+        if (
+            state is None
+            or state.version != version
+            or time.monotonic() - state.built_at > MAP_TTL
+        ):
+            with self.lock:
+                if self.state is state:
+                    self.state = MapState(
+                        ids=dict(Tag.objects.values_list('slug', 'pk')),
+                        version=version,
+                        built_at=time.monotonic(),
+                    )
+                state = self.state
+        return state
+
+
+tag_map = TagMap()
@@ -0,0 +1,24 @@
+from django.apps import apps
+
+from jobs.registry import task
+from . import feed, images
+
+
+@task('food.build_image_variants')
+def build_image_variants(model, pk):
+    images.build_variants(apps.get_model(model), pk)
+
+
+@task('food.delete_files', priority=-1)
+def delete_files(paths):
+    images.delete_files(paths)
+
+
+@task('food.fan_out_recipe', priority=1)
+def fan_out_recipe(recipe_id):
+    feed.fan_out(recipe_id)
+
+
+@task('food.backfill_followers')
+def backfill_followers(author_ids):
+    feed.backfill_followers(author_ids)
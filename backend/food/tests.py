@@ -0,0 +1,167 @@
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+
+from food.management.commands.data_loader import CatalogLoader
+from food.models import Ingredient, Recipe, Tag, User
+from food.shortlinks import short_links
+from food.transfer import RecipeImporter
+
+MEDIA_ROOT = tempfile.mkdtemp()
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bK'
+    'AAAAA1BMVEUAAACnej3aAAAAAXRSTlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMA'
+    'AAAASUVORK5CYII='
+)
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+class CatalogLoaderTests(TestCase):
+    """Загрузка справочника с обновлением по ключу."""
+
+    def setUp(self):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        self.loader = CatalogLoader(Tag, 'slug', ('slug', 'name'))
+
+    def test_counts_and_conflicts(self):
+        stats = self.loader.load([
+            {'slug': 'breakfast', 'name': 'Утро'},
+            {'slug': 'breakfast', 'name': 'Завтрак'},
+            {'slug': 'lunch', 'name': 'Обед'},
+            # Название занято другим слагом — в БД и выше в пачке.
+            {'slug': 'morning', 'name': 'Завтрак'},
+            {'slug': 'dinner', 'name': 'Обед'},
+            {'slug': 'supper', 'name': 'Ужин'},
+        ])
+        self.assertEqual(stats, {
+            'total': 6, 'created': 2, 'updated': 1, 'merged': 1,
+            'conflicts': 2,
+        })
+        self.assertEqual(len(self.loader.conflicts), 2)
+        self.assertIn('Строка 4', self.loader.conflicts[0])
+        self.assertIn('Строка 5', self.loader.conflicts[1])
+        self.assertEqual(
+            dict(Tag.objects.values_list('slug', 'name')),
+            {'breakfast': 'Завтрак', 'lunch': 'Обед', 'supper': 'Ужин'}
+        )
+
+    def test_batches(self):
+        self.loader.batch_size = 2
+        stats = self.loader.load([
+            {'slug': 'lunch', 'name': 'Обед'},
+            {'slug': 'lunch', 'name': 'Обед'},
+            {'slug': 'lunch', 'name': 'Второй обед'},
+        ])
+        self.assertEqual(
+            (stats['created'], stats['updated'], stats['merged']), (1, 1, 1)
+        )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeImporterTests(TestCase):
+    """Загрузка рецептов из JSONL."""
+
+    def setUp(self):
+        User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass'
+        )
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        Ingredient.objects.create(name='яйца', measurement_unit='шт')
+        self.pool = ThreadPoolExecutor(2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def line(self, **fields):
+        record = {
+            'author': 'cook@example.com', 'name': 'Омлет', 'text': '...',
+            'cooking_time': 10, 'tags': ['breakfast'],
+            'ingredients': [{'name': 'яйца', 'amount': 2}], 'image': IMAGE,
+        }
+        record.update(fields)
+        return json.dumps(record)
+
+    def test_image_outside_storage_is_invalid(self):
+        importer = RecipeImporter(self.pool, skip_invalid=True)
+        loaded, existing = importer.import_batch([
+            self.line(name='Первый', image='../x.png'),
+            self.line(name='Второй', image='/etc/passwd'),
+            self.line(),
+        ], 1)
+        self.assertEqual((loaded, existing), (1, 0))
+        self.assertEqual(len(importer.errors), 2)
+        self.assertIn('Строка 1', importer.errors[0])
+        self.assertIn('вне хранилища', importer.errors[0])
+
+    def test_reimport_without_created_at(self):
+        lines = [self.line(), self.line(), self.line(name='Яичница')]
+        importer = RecipeImporter(self.pool)
+        self.assertEqual(importer.import_batch(lines, 1), (2, 1))
+        self.assertEqual(importer.import_batch(lines, 1), (0, 3))
+        self.assertEqual(Recipe.objects.count(), 2)
+
+
+class ShortLinkTests(TestCase):
+    """Коды коротких ссылок и переходы по ним."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass'
+        )
+        cls.recipe = cls.create_recipe()
+
+    @classmethod
+    def create_recipe(cls, **fields):
+        return Recipe.objects.create(
+            author=cls.author, name='Омлет', text='...', cooking_time=10,
+            image='recipes/images/test.jpg', **fields
+        )
+
+    def setUp(self):
+        short_links.misses.clear()
+        short_links.warm()
+        # Переходы не должны записываться в БД посреди замера запросов.
+        short_links.flushed_at = time.monotonic()
+
+    def tearDown(self):
+        short_links.clicks.clear()
+        short_links.pending = 0
+
+    def test_code_collision(self):
+        recipe = self.create_recipe(short_code=self.recipe.short_code)
+        self.assertNotEqual(recipe.short_code, self.recipe.short_code)
+        with mock.patch(
+            'food.models.generate_short_code',
+            return_value=self.recipe.short_code,
+        ), self.assertRaises(IntegrityError):
+            self.create_recipe(short_code=self.recipe.short_code)
+
+    def test_redirect(self):
+        for url in (
+            f'/s/{self.recipe.short_code}/', f'/s/{self.recipe.pk}/'
+        ):
+            with self.subTest(url=url), self.assertNumQueries(0):
+                response = self.client.get(url)
+                self.assertRedirects(
+                    response, f'/recipes/{self.recipe.pk}/',
+                    fetch_redirect_response=False
+                )
+
+    def test_missing(self):
+        for url in ('/s/missing1/', f'/s/{self.recipe.pk + 1000}/'):
+            with self.subTest(url=url):
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.client.get(url).status_code, 404)
+                # Неизвестный код запомнен и БД больше не спрашивается.
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,458 @@
+"""Перенос рецептов между окружениями в формате JSONL.
+
+Каждая строка файла — один рецепт:
+
+    {"author": "user@example.com", "name": "Омлет", "text": "...",
+     "cooking_time": 10, "created_at": "2024-05-01T09:00:00+00:00",
+     "updated_at": "2024-05-01T09:00:00+00:00", "tags": ["breakfast"],
+     "ingredients": [{"name": "яйца", "amount": 2}],
+     "image": "recipes/images/omelette.jpg"}
+
+Автор ищется по email, теги — по slug, ингредиенты — по названию.
+Картинка — путь к файлу (в каталоге media_dir или, без него, уже в
+хранилище) либо data URI с base64, как в API. Файлы картинок копируются
+и декодируются в пуле потоков.
+
+Загрузка идёт пачками: авторы, теги и ингредиенты пачки выбираются тремя
+запросами, рецепты, их ингредиенты и теги вставляются bulk_create в одной
+транзакции. Рецепт с тем же автором, названием и датой публикации
+считается уже загруженным и пропускается, поэтому повторная загрузка
+файла не создаёт дублей. У рецепта без created_at дата берётся текущая,
+поэтому для него дублем считается любой рецепт того же автора с тем же
+названием.
+"""
+import base64
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import feed
+from .constants import COOKING_TIME_MIN_VALUE, INGREDIENT_AMOUNT_MIN_VALUE
+from .counters import COUNTERS, repair
+from .images import schedule_variants
+from .models import (ContentVersion, Ingredient, IngredientRecipe, Recipe,
+                     Tag, User)
+from .search import update_search_index
+
+BATCH_SIZE = 500
+IMAGE_WORKERS = 8
+REQUIRED_FIELDS = (
+    'author', 'name', 'text', 'cooking_time', 'tags', 'ingredients', 'image'
+)
+_explicit_dates_lock = threading.Lock()
+
+
+@contextmanager
+def explicit_dates(model):
+    """
+    Отключает auto_now и auto_now_add у полей model, чтобы bulk_create
+    записал даты из объектов, а не текущее время.
+
+    Флаги меняются у общего для процесса класса модели: пока блок
+    выполняется, любой save() этой модели в других потоках тоже не
+    проставит даты. Поэтому блок держит блокировку и предназначен для
+    однопоточных команд вроде import_recipes, а не для запросов API.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    with _explicit_dates_lock:
+        flags = [
+            (field, field.auto_now, field.auto_now_add) for field in fields
+        ]
+        try:
+            for field in fields:
+                field.auto_now = field.auto_now_add = False
+            yield
+        finally:
+            for field, auto_now, auto_now_add in flags:
+                field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Checkpoint:
+    """Состояние прерванной выгрузки или загрузки в JSON-файле."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def save(self, **state):
+        # Запись во временный файл и переименование: после сбоя остаётся
+        # целиком либо прежняя, либо новая контрольная точка.
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def export_batches(after_id=0, batch_size=BATCH_SIZE):
+    """Пачки рецептов с id больше after_id в порядке возрастания id."""
+    recipes = Recipe.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch(
+            'recipe_ingredients',
+            queryset=IngredientRecipe.objects.select_related('ingredient')
+        ),
+    ).order_by('pk')
+    while batch := list(recipes.filter(pk__gt=after_id)[:batch_size]):
+        yield batch
+        after_id = batch[-1].pk
+
+
+def export_record(recipe, image):
+    return {
+        'author': recipe.author.email,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'created_at': recipe.created_at.isoformat(),
+        'updated_at': recipe.updated_at.isoformat(),
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            {'name': item.ingredient.name, 'amount': item.amount}
+            for item in recipe.recipe_ingredients.all()
+        ],
+        'image': image,
+    }
+
+
+def export_image(name, media_dir=None, embed=False):
+    """
+    Значение поля image для файла name: data URI (embed) или путь; с
+    media_dir файл копируется в этот каталог, если его там ещё нет.
+    """
+    if not name:
+        return None
+    if embed:
+        with default_storage.open(name, 'rb') as file:
+            content = base64.b64encode(file.read()).decode()
+        extension = os.path.splitext(name)[1].lstrip('.').lower()
+        return f'data:image/{extension};base64,{content}'
+    if media_dir:
+        target = os.path.join(media_dir, name)
+        if not (
+            os.path.exists(target)
+            and os.path.getsize(target) == default_storage.size(name)
+        ):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with default_storage.open(name, 'rb') as source, open(
+                target, 'wb'
+            ) as file:
+                shutil.copyfileobj(source, file)
+    return name
+
+
+def check_integer(record, field, minimum):
+    value = record[field]
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f'{field} должно быть целым числом')
+    if value < minimum:
+        raise ValueError(f'{field} не может быть меньше {minimum}')
+
+
+def check_datetime(record, field):
+    value = record.get(field)
+    if not value:
+        return None
+    value = parse_datetime(str(value))
+    if value is None:
+        raise ValueError(f'{field}: некорректная дата')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def parse_record(line):
+    """Проверяет строку JSONL, возвращает рецепт с приведёнными полями."""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as error:
+        raise ValueError(f'некорректный JSON: {error}')
+    if not isinstance(record, dict):
+        raise ValueError('ожидался объект')
+    missing = [field for field in REQUIRED_FIELDS if not record.get(field)]
+    if missing:
+        raise ValueError(f'нет полей {", ".join(missing)}')
+    name_length = Recipe._meta.get_field('name').max_length
+    if len(str(record['name'])) > name_length:
+        raise ValueError(f'name длиннее {name_length} символов')
+    check_integer(record, 'cooking_time', COOKING_TIME_MIN_VALUE)
+    tags = record['tags']
+    if not isinstance(tags, list) or len(set(map(str, tags))) != len(tags):
+        raise ValueError('tags должен быть списком без повторов')
+    ingredients = record['ingredients']
+    if not isinstance(ingredients, list) or not all(
+        isinstance(item, dict) and item.get('name') for item in ingredients
+    ):
+        raise ValueError('ingredients должен быть списком объектов с name')
+    for item in ingredients:
+        check_integer(item, 'amount', INGREDIENT_AMOUNT_MIN_VALUE)
+    if len({item['name'] for item in ingredients}) != len(ingredients):
+        raise ValueError('ингредиенты повторяются')
+    return {
+        'author': str(record['author']),
+        'name': str(record['name']),
+        'text': str(record['text']),
+        'cooking_time': record['cooking_time'],
+        'created_at': check_datetime(record, 'created_at'),
+        'updated_at': check_datetime(record, 'updated_at'),
+        'tags': [str(slug) for slug in tags],
+        'ingredients': [
+            (str(item['name']), item['amount']) for item in ingredients
+        ],
+        'image': str(record['image']),
+    }
+
+
+class RecipeImporter:
+    """
+    Загружает пачки строк JSONL; картинки сохраняются пулом потоков pool.
+    С skip_invalid ошибочные строки пропускаются и копятся в errors,
+    иначе первая же ошибка прерывает загрузку с ValueError.
+    """
+
+    def __init__(self, pool, media_dir=None, skip_invalid=False):
+        self.pool = pool
+        self.media_dir = media_dir and os.path.abspath(media_dir)
+        self.skip_invalid = skip_invalid
+        self.image_field = Recipe._meta.get_field('image')
+        self.author_ids = set()
+        self.errors = []
+
+    def invalid(self, number, error):
+        message = f'Строка {number}: {error}.'
+        if not self.skip_invalid:
+            raise ValueError(message)
+        self.errors.append(message)
+
+    def import_batch(self, lines, first_number):
+        """
+        Загружает строки lines (первая имеет номер first_number).
+        Возвращает число загруженных рецептов и уже загруженных ранее.
+        """
+        records = []
+        for number, line in enumerate(lines, first_number):
+            if not line.strip():
+                continue
+            try:
+                records.append((number, parse_record(line)))
+            except ValueError as error:
+                self.invalid(number, error)
+        records = self.resolve(records)
+        new_records = self.exclude_existing(records)
+        existing = len(records) - len(new_records)
+        new_records = self.save_images(new_records)
+        self.write(new_records)
+        return len(new_records), existing
+
+    def resolve(self, records):
+        """Заменяет email, slug и названия на id тремя запросами."""
+        authors = dict(User.objects.filter(
+            email__in={record['author'] for _, record in records}
+        ).values_list('email', 'pk'))
+        tags = dict(Tag.objects.filter(slug__in={
+            slug for _, record in records for slug in record['tags']
+        }).values_list('slug', 'pk'))
+        ingredients = dict(Ingredient.objects.filter(name__in={
+            name for _, record in records
+            for name, _ in record['ingredients']
+        }).values_list('name', 'pk'))
+        resolved = []
+        for number, record in records:
+            errors = []
+            if record['author'] not in authors:
+                errors.append(f'нет пользователя {record["author"]}')
+            missing = [slug for slug in record['tags'] if slug not in tags]
+            if missing:
+                errors.append(f'нет тегов {", ".join(missing)}')
+            missing = [
+                name for name, _ in record['ingredients']
+                if name not in ingredients
+            ]
+            if missing:
+                errors.append(f'нет ингредиентов {", ".join(missing)}')
+            if errors:
+                self.invalid(number, '; '.join(errors))
+                continue
+            record['author_id'] = authors[record['author']]
+            record['tag_ids'] = [tags[slug] for slug in record['tags']]
+            record['ingredient_amounts'] = [
+                (ingredients[name], amount)
+                for name, amount in record['ingredients']
+            ]
+            resolved.append((number, record))
+        return resolved
+
+    def exclude_existing(self, records):
+        """
+        Убирает рецепты, уже загруженные прежде (или выше в файле).
+        Рецепт с датой сверяется по автору, названию и дате, без даты —
+        только по автору и названию.
+        """
+        dated = Recipe.objects.filter(
+            author_id__in={record['author_id'] for _, record in records},
+            created_at__in={
+                record['created_at'] for _, record in records
+                if record['created_at']
+            },
+        ).values_list('author_id', 'name', 'created_at')
+        existing = set(dated)
+        undated = [record for _, record in records if not record['created_at']]
+        if undated:
+            existing.update(
+                (author_id, name, None)
+                for author_id, name in Recipe.objects.filter(
+                    author_id__in={record['author_id'] for record in undated},
+                    name__in={record['name'] for record in undated},
+                ).values_list('author_id', 'name')
+            )
+        new_records = []
+        for number, record in records:
+            key = (record['author_id'], record['name'], record['created_at'])
+            if key in existing:
+                continue
+            existing.add(key)
+            if record['created_at']:
+                existing.add(key[:2] + (None,))
+            new_records.append((number, record))
+        return new_records
+
+    def save_images(self, records):
+        """
+        Сохраняет картинки пачки в пуле потоков. При ошибке уже
+        сохранённые файлы пачки удаляются.
+        """
+        futures = [
+            self.pool.submit(self.import_image, record['image'])
+            for _, record in records
+        ]
+        saved, created, error = [], [], None
+        for (number, record), future in zip(records, futures):
+            try:
+                name, is_new = future.result()
+            except (OSError, ValueError) as image_error:
+                error = error or (number, image_error)
+                if self.skip_invalid:
+                    self.invalid(number, image_error)
+                continue
+            if is_new:
+                created.append(name)
+            record['image'], record['image_created'] = name, is_new
+            saved.append((number, record))
+        if error and not self.skip_invalid:
+            for name in created:
+                default_storage.delete(name)
+            self.invalid(*error)
+        return saved
+
+    def import_image(self, value):
+        """Сохраняет картинку, возвращает имя файла и создан ли он."""
+        if value.startswith('data:'):
+            try:
+                header, content = value.split(';base64,', 1)
+                content = base64.b64decode(content, validate=True)
+            except ValueError:
+                raise ValueError('некорректная картинка в base64')
+            extension = header.split('/')[-1]
+            return self.save_image(
+                f'image.{extension}', ContentFile(content)
+            ), True
+        if self.media_dir is None:
+            try:
+                exists = default_storage.exists(value)
+            except SuspiciousFileOperation:
+                raise ValueError(f'путь {value} вне хранилища')
+            if not exists:
+                raise ValueError(f'нет файла {value}')
+            return value, False
+        path = os.path.normpath(os.path.join(self.media_dir, value))
+        if os.path.commonpath((self.media_dir, path)) != self.media_dir:
+            raise ValueError(f'путь {value} вне каталога картинок')
+        with open(path, 'rb') as file:
+            return self.save_image(os.path.basename(path), File(file)), True
+
+    def save_image(self, filename, content):
+        return default_storage.save(
+            self.image_field.generate_filename(None, filename), content
+        )
+
+    def write(self, records):
+        if not records:
+            return
+        try:
+            with transaction.atomic():
+                now = timezone.now()
+                with explicit_dates(Recipe):
+                    recipes = Recipe.objects.bulk_create(
+                        Recipe(
+                            author_id=record['author_id'],
+                            name=record['name'],
+                            text=record['text'],
+                            cooking_time=record['cooking_time'],
+                            image=record['image'],
+                            created_at=record['created_at'] or now,
+                            updated_at=(
+                                record['updated_at']
+                                or record['created_at'] or now
+                            ),
+                        )
+                        for _, record in records
+                    )
+                IngredientRecipe.objects.bulk_create(
+                    IngredientRecipe(
+                        recipe=recipe, ingredient_id=ingredient_id,
+                        amount=amount
+                    )
+                    for recipe, (_, record) in zip(recipes, records)
+                    for ingredient_id, amount in record['ingredient_amounts']
+                )
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+                    for recipe, (_, record) in zip(recipes, records)
+                    for tag_id in record['tag_ids']
+                )
+                update_search_index([recipe.pk for recipe in recipes])
+                schedule_variants(*recipes)
+                ContentVersion.objects.bump('recipe')
+        except Exception:
+            for _, record in records:
+                if record['image_created']:
+                    default_storage.delete(record['image'])
+            raise
+        self.author_ids.update(record['author_id'] for _, record in records)
+
+    def finish(self):
+        """
+        Обновляет то, что при поштучном создании рецептов делают сигналы:
+        счётчики рецептов авторов и ленты подписчиков.
+        """
+        for counter in COUNTERS:
+            if counter.source is Recipe:
+                repair(counter)
+        ContentVersion.objects.bump('user')
+        feed.backfill_followers(self.author_ids)
@@ -4,4 +4,5 @@ from . import views
 
 urlpatterns = [
     path('s/<int:recipe_id>/', views.recipe_redirect),
+    path('s/<str:code>/', views.short_link_redirect),
 ]
@@ -1,11 +1,21 @@
 from django.http import Http404
 from django.shortcuts import redirect
 
-from .models import Recipe
+from .shortlinks import short_links
 
 
 def recipe_redirect(request, recipe_id):
-    """Переход по короткой ссылке."""
-    if not Recipe.objects.filter(pk=recipe_id).exists():
+    """Переход по короткой ссылке с id рецепта (старый формат)."""
+    if not short_links.exists(recipe_id):
         raise Http404(f"Рецепт с ID {recipe_id} не найден")
+    short_links.click(recipe_id)
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+def short_link_redirect(request, code):
+    """Переход по короткой ссылке с кодом рецепта."""
+    recipe_id = short_links.resolve(code)
+    if recipe_id is None:
+        raise Http404(f"Короткая ссылка {code} не найдена")
+    short_links.click(recipe_id)
     return redirect(f'/recipes/{recipe_id}/')
@@ -14,5 +14,7 @@ admin_site = CustomAdminSite(name='customadmin')
 @admin.register(Token, site=admin_site)
 class TokenAdmin(admin.ModelAdmin):
     list_display = ('key', 'user', 'created')
+    list_select_related = ('user',)
     search_fields = ('key', 'user__username')
     readonly_fields = ('key', 'created')
+    autocomplete_fields = ('user',)
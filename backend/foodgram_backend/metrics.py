@@ -0,0 +1,145 @@
+"""Метрики в формате Prometheus и эндпоинт /metrics.
+
+Метрики хранятся в памяти процесса (gunicorn по умолчанию запускает один
+рабочий процесс); гистограммы запросов собирает RequestMetricsMiddleware,
+счётчики кеша токенов — api.authentication. /metrics отвечает
+только адресам из METRICS_ALLOWED_NETWORKS, остальным — 404.
+"""
+import ipaddress
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Гистограмма с метками labels, безопасная для потоков."""
+
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self.lock:
+            counts, total = self.series.get(
+                label_values, ([0] * (len(self.buckets) + 1), 0)
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            self.series[label_values] = counts, total + value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        with self.lock:
+            series = [
+                (label_values, list(counts), total)
+                for label_values, (counts, total) in self.series.items()
+            ]
+        for label_values, counts, total in sorted(series):
+            labels = ','.join(
+                f'{label}="{escape(value)}"'
+                for label, value in zip(self.labels, label_values)
+            )
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield (
+                    f'{self.name}_bucket{{{labels},le="{bound}"}} '
+                    f'{cumulative}'
+                )
+            yield f'{self.name}_sum{{{labels}}} {total}'
+            yield f'{self.name}_count{{{labels}}} {cumulative}'
+
+
+class Counter:
+    """Счётчик с метками labels, безопасный для потоков."""
+
+    def __init__(self, name, description, labels):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, label_values, value=1):
+        with self.lock:
+            self.series[label_values] = (
+                self.series.get(label_values, 0) + value
+            )
+
+    def render(self):
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} counter'
+        with self.lock:
+            series = sorted(self.series.items())
+        for label_values, value in series:
+            labels = ','.join(
+                f'{label}="{escape(value)}"'
+                for label, value in zip(self.labels, label_values)
+            )
+            yield f'{self.name}{{{labels}}} {value}'
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+request_duration = Histogram(
+    'foodgram_request_duration_seconds', 'Время обработки запроса.',
+    ('view', 'method', 'status'), DURATION_BUCKETS
+)
+db_duration = Histogram(
+    'foodgram_db_duration_seconds', 'Время SQL-запросов за запрос.',
+    ('view',), DURATION_BUCKETS
+)
+db_queries = Histogram(
+    'foodgram_db_queries', 'Число SQL-запросов за запрос.',
+    ('view',), QUERY_COUNT_BUCKETS
+)
+serializer_duration = Histogram(
+    'foodgram_serializer_duration_seconds',
+    'Время сериализации ответа за запрос.', ('view',), DURATION_BUCKETS
+)
+token_cache = Counter(
+    'foodgram_token_cache_total',
+    'Проверки токенов: hit — из кеша процесса, shared_hit — из общего '
+    'кеша, miss — из БД.', ('result',)
+)
+METRICS = (
+    request_duration, db_duration, db_queries, serializer_duration,
+    token_cache,
+)
+
+
+def allowed_networks():
+    return [
+        ipaddress.ip_network(network.strip())
+        for network in settings.METRICS_ALLOWED_NETWORKS
+        if network.strip()
+    ]
+
+
+def metrics(request):
+    """Все метрики в текстовом формате Prometheus."""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        raise Http404
+    if not any(address in network for network in allowed_networks()):
+        raise Http404
+    lines = [line for metric in METRICS for line in metric.render()]
+    return HttpResponse('\n'.join(lines) + '\n', content_type=CONTENT_TYPE)
@@ -0,0 +1,130 @@
+"""Замер времени запросов: SQL, сериализация и обработка целиком.
+
+RequestMetricsMiddleware оборачивает SQL-запросы через execute_wrapper,
+а сериализацию замеряют сериализаторы с TimedSerializerMixin (время
+вложенных сериализаторов входит во время внешнего). Итоги по имени
+представления попадают в гистограммы foodgram_backend.metrics и в
+заголовок Server-Timing; запросы дольше SLOW_REQUEST_THRESHOLD мс пишутся в лог
+вместе с самыми долгими SQL-запросами. Для потоковых ответов
+учитывается время до начала отдачи.
+"""
+import heapq
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+SLOWEST_QUERIES = 5
+SQL_LOG_LENGTH = 500
+
+logger = logging.getLogger(__name__)
+current_request = ContextVar('current_request', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0
+        self.slowest_queries = []
+        self.serializer_time = 0
+        self.serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.query_count += 1
+            self.query_time += duration
+            item = (duration, self.query_count, sql)
+            if len(self.slowest_queries) < SLOWEST_QUERIES:
+                heapq.heappush(self.slowest_queries, item)
+            else:
+                heapq.heappushpop(self.slowest_queries, item)
+
+
+class TimedSerializerMixin:
+    """
+    Добавляет время to_representation ко времени сериализации текущего
+    запроса. Для many=True замеряется каждый объект списка.
+    """
+
+    def to_representation(self, instance):
+        request_metrics = current_request.get()
+        if request_metrics is None or request_metrics.serializer_depth:
+            return super().to_representation(instance)
+        request_metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            request_metrics.serializer_time += time.perf_counter() - started
+            request_metrics.serializer_depth -= 1
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path == '/metrics':
+            return self.get_response(request)
+        request_metrics = RequestMetrics()
+        token = current_request.set(request_metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(
+                        request_metrics.record_query
+                    ))
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        total = time.perf_counter() - request_metrics.started
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        metrics.request_duration.observe(
+            (view, request.method, str(response.status_code)), total
+        )
+        metrics.db_duration.observe((view,), request_metrics.query_time)
+        metrics.db_queries.observe((view,), request_metrics.query_count)
+        metrics.serializer_duration.observe(
+            (view,), request_metrics.serializer_time
+        )
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={request_metrics.query_time * 1000:.1f};'
+                f'desc="{request_metrics.query_count} queries", '
+                'serializer;'
+                f'dur={request_metrics.serializer_time * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}'
+            )
+        if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD:
+            self.log_slow_request(
+                request, response, view, total, request_metrics
+            )
+        return response
+
+    @staticmethod
+    def log_slow_request(request, response, view, total, request_metrics):
+        queries = '\n'.join(
+            f'  {duration * 1000:.1f} мс: {sql[:SQL_LOG_LENGTH]}'
+            for duration, _, sql in sorted(
+                request_metrics.slowest_queries, reverse=True
+            )
+        )
+        logger.warning(
+            'Медленный запрос %s %s (%s): %s за %.0f мс, SQL: %d запросов '
+            '%.0f мс, сериализация %.0f мс. Самые долгие запросы:\n%s',
+            request.method, request.get_full_path(), view,
+            response.status_code, total * 1000, request_metrics.query_count,
+            request_metrics.query_time * 1000,
+            request_metrics.serializer_time * 1000, queries,
+        )
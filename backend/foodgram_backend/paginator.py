@@ -0,0 +1,122 @@
+"""Пагинатор с оценкой числа записей вместо точного COUNT(*).
+
+На PostgreSQL число строк для запроса без условий берётся из
+pg_class.reltuples, для запроса с условиями — из оценки планировщика
+(EXPLAIN). Если оценка меньше exact_count_limit, считается точное число
+(на других СУБД — всегда). Числа от exact_count_limit и больше кешируются
+на count_cache_timeout секунд по тексту запроса, так что у каждого набора
+фильтров своё число; небольшие выборки (например, избранное
+пользователя) всегда считаются заново и сразу видят изменения.
+
+Оценка может отличаться от настоящего числа строк, поэтому при оценке
+последняя страница не обрезается по count, номер страницы больше
+num_pages не считается ошибкой (такая страница просто пуста), а есть ли
+следующая страница, определяется по лишней (per_page + 1) строке.
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import (EmptyPage, Page, PageNotAnInteger,
+                                   Paginator)
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+COUNT_CACHE_KEY = 'paginator_count:{}'
+
+
+class EstimatedPage(Page):
+    """Страница, которая знает о следующей без точного числа записей."""
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    exact_count_limit = 10000
+    count_cache_timeout = 60
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        queryset = queryset.order_by()
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = COUNT_CACHE_KEY.format(hashlib.sha256(
+            f'{queryset.db}:{sql}:{params!r}'.encode()
+        ).hexdigest())
+        cached = cache.get(key)
+        if cached is not None:
+            count, self.estimated = cached
+            return count
+        count = None
+        if connections[queryset.db].vendor == 'postgresql':
+            count = self.estimate(queryset, sql, params)
+        if count is None or count < self.exact_count_limit:
+            count = queryset.count()
+        else:
+            self.estimated = True
+        if count >= self.exact_count_limit:
+            cache.set(key, (count, self.estimated), self.count_cache_timeout)
+        return count
+
+    @staticmethod
+    def estimate(queryset, sql, params):
+        """Оценка числа строк; None, если таблица ещё не анализировалась."""
+        query = queryset.query
+        with connections[queryset.db].cursor() as cursor:
+            if not query.where and not query.distinct and (
+                query.group_by is None
+            ):
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    (queryset.model._meta.db_table,)
+                )
+                row = cursor.fetchone()
+                # -1 — статистики по таблице ещё нет.
+                if row is None or row[0] < 0:
+                    return None
+                return int(row[0])
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def validate_number(self, number):
+        if not self.estimated:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        # count вычисляется до проверки номера: от него зависит estimated.
+        self.count
+        if not self.estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1]
+        )
+        return EstimatedPage(
+            object_list[:self.per_page], number, self,
+            has_more=len(object_list) > self.per_page,
+        )
@@ -30,9 +30,11 @@ INSTALLED_APPS = [
     'djoser',
     'food.apps.FoodConfig',
     'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'foodgram_backend.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -130,12 +132,45 @@ AUTHENTICATION_BACKENDS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Заголовок Server-Timing с временем SQL и сериализации в ответах.
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'False').lower() == 'true'
+# Запросы дольше стольких миллисекунд пишутся в лог.
+SLOW_REQUEST_THRESHOLD = int(os.getenv('SLOW_REQUEST_THRESHOLD', 500))
+# Адреса, которым доступен /metrics.
+METRICS_ALLOWED_NETWORKS = os.getenv(
+    'METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128'
+).split(',')
+
+# Кеш токенов api.authentication: записей в процессе и их срок жизни в
+# секундах, а также общий кеш Django поверх кеша процесса. Выход, смена
+# пароля и деактивация сбрасывают кеш только своего процесса (и общий
+# кеш): при TOKEN_CACHE_SHARED=False, по умолчанию, в других процессах
+# вышедший или деактивированный токен ещё до TOKEN_CACHE_TTL секунд
+# принимается в GET-запросах. Изменяющие запросы проверяются по БД.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', 'False').lower() == 'true'
+TOKEN_SHARED_CACHE_TTL = int(os.getenv('TOKEN_SHARED_CACHE_TTL', 300))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': PAGINATION_LIMIT,
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ]
 }
 
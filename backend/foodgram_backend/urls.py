@@ -1,9 +1,11 @@
 from django.urls import include, path
 
 from .admin import admin_site
+from .metrics import metrics
 
 urlpatterns = [
     path('admin/', admin_site.urls),
+    path('metrics', metrics),
     path('api/', include(('api.urls', 'api'), namespace='api')),
     path('', include(('food.urls', 'food'), namespace='food')),
 ]
@@ -7,10 +7,22 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 """
 
+import logging
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.db import DatabaseError
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
 application = get_wsgi_application()
+
+from food.shortlinks import short_links  # noqa: E402
+
+try:
+    short_links.warm()
+except DatabaseError:
+    # Карта построится при первом переходе по короткой ссылке.
+    logging.getLogger(__name__).exception(
+        'Не удалось загрузить короткие ссылки'
+    )
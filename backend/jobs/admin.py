@@ -0,0 +1,24 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from foodgram_backend.admin import admin_site
+from .models import Job
+
+
+@admin.register(Job, site=admin_site)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id', 'name', 'status', 'priority', 'attempts', 'run_at',
+        'locked_by', 'created_at'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'created_at')
+    actions = ('retry',)
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, attempts=0, run_at=timezone.now(),
+            last_error=''
+        )
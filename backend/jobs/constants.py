@@ -0,0 +1,10 @@
+BATCH_SIZE = 10
+POLL_INTERVAL = 1
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+# Задачи, которые выполняются дольше, считаются брошенными упавшим
+# обработчиком и возвращаются в очередь.
+LOCK_TIMEOUT = 10 * 60
+NAME_MAX_LENGTH = 128
+WORKER_MAX_LENGTH = 128
@@ -0,0 +1,44 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.constants import BATCH_SIZE, POLL_INTERVAL
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из очереди (jobs.Job). Если очередь '
+        'пуста, опрашивает её раз в --poll-interval секунд.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--poll-interval', type=float, default=POLL_INTERVAL
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить все готовые задачи и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        worker = Worker(options['batch_size'])
+        self.stdout.write(f'Обработчик {worker.name} запущен.')
+        while not self.stopping:
+            close_old_connections()
+            if worker.run_batch():
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(f'Обработчик {worker.name} остановлен.')
+
+    def stop(self, signum, frame):
+        # Текущая пачка дорабатывается до конца.
+        self.stopping = True
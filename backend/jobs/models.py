@@ -0,0 +1,92 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from .constants import MAX_ATTEMPTS, NAME_MAX_LENGTH, WORKER_MAX_LENGTH
+
+
+class Job(models.Model):
+    """
+    Фоновая задача: имя зарегистрированной функции (jobs.registry) и её
+    именованные аргументы. Выполненные задачи удаляются, упавшие после
+    всех попыток остаются со статусом failed для разбора.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=NAME_MAX_LENGTH,
+        verbose_name='Задача',
+    )
+    payload = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Аргументы',
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        verbose_name='Приоритет',
+        help_text='Задачи с большим приоритетом выполняются раньше.',
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=MAX_ATTEMPTS,
+        verbose_name='Максимум попыток',
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Выполнить не раньше',
+    )
+    locked_by = models.CharField(
+        max_length=WORKER_MAX_LENGTH,
+        blank=True,
+        verbose_name='Обработчик',
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Взята в работу',
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана',
+    )
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        ordering = ('-priority', 'run_at', 'id')
+        indexes = [
+            models.Index(
+                fields=('-priority', 'run_at', 'id'),
+                condition=Q(status='pending'),
+                name='job_pending_idx',
+            ),
+            models.Index(
+                fields=('locked_by',),
+                condition=Q(status='running'),
+                name='job_running_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.get_status_display()})'
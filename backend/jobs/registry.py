@@ -0,0 +1,64 @@
+"""Регистрация фоновых задач и постановка их в очередь.
+
+Задача — функция с именованными JSON-сериализуемыми аргументами,
+объявленная декоратором task в модуле tasks приложения:
+
+    @task('food.delete_files')
+    def delete_files(paths):
+        ...
+
+    delete_files.enqueue(paths=[...])  # или enqueue('food.delete_files', ...)
+
+Запись Job создаётся в текущей транзакции, поэтому задача попадает в
+очередь только вместе с изменениями, которые её породили.
+"""
+from collections import namedtuple
+from datetime import timedelta
+from functools import partial
+
+from django.utils import timezone
+
+from .constants import MAX_ATTEMPTS
+from .models import Job
+
+Task = namedtuple('Task', ('function', 'priority', 'max_attempts'))
+
+tasks = {}
+
+
+def task(name, priority=0, max_attempts=MAX_ATTEMPTS):
+    def register(function):
+        if name in tasks:
+            raise ValueError(f'Задача {name} уже зарегистрирована.')
+        tasks[name] = Task(function, priority, max_attempts)
+        function.enqueue = partial(enqueue, name)
+        return function
+    return register
+
+
+def enqueue(name, priority=None, delay=0, **payload):
+    """Ставит задачу name в очередь; delay — отсрочка в секундах."""
+    registered = tasks[name]
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        priority=registered.priority if priority is None else priority,
+        max_attempts=registered.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def enqueue_many(name, payloads, priority=None):
+    """Ставит задачу name в очередь для каждого payload одной вставкой."""
+    registered = tasks[name]
+    now = timezone.now()
+    return Job.objects.bulk_create(
+        Job(
+            name=name,
+            payload=payload,
+            priority=registered.priority if priority is None else priority,
+            max_attempts=registered.max_attempts,
+            run_at=now,
+        )
+        for payload in payloads
+    )
@@ -0,0 +1,110 @@
+"""Обработчик очереди задач.
+
+Задачи забираются пачками: на PostgreSQL строки блокируются
+SELECT ... FOR UPDATE SKIP LOCKED, и параллельные обработчики не ждут
+друг друга; на SQLite, где блокировок строк нет, кандидаты захватываются
+условным UPDATE (status='pending'), и задачу получает только тот, чей
+UPDATE изменил строку. Задача выполняется не менее одного раза: после
+падения обработчика она вернётся в очередь через LOCK_TIMEOUT.
+"""
+import logging
+import os
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .constants import (BATCH_SIZE, LOCK_TIMEOUT, MAX_RETRY_DELAY,
+                        RETRY_DELAY)
+from .models import Job
+from .registry import tasks
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная отсрочка повтора после attempts неудачных попыток."""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+class Worker:
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+
+    def run_batch(self):
+        """Выполняет одну пачку задач и возвращает их число."""
+        self.requeue_stale()
+        jobs = self.claim()
+        for job in jobs:
+            self.execute(job)
+        return len(jobs)
+
+    def pending(self):
+        return Job.objects.filter(
+            status=Job.PENDING, run_at__lte=timezone.now()
+        ).order_by('-priority', 'run_at', 'id')
+
+    def claim(self):
+        token = f'{self.name}:{uuid.uuid4().hex[:8]}'
+        if connection.features.has_select_for_update_skip_locked:
+            with transaction.atomic():
+                self.lock(self.pending().select_for_update(
+                    skip_locked=True
+                ), token)
+        else:
+            # Без транзакции: на SQLite чтение с последующей записью в
+            # одной транзакции падает, если базу пишет другой процесс.
+            self.lock(self.pending(), token)
+        return list(Job.objects.filter(
+            status=Job.RUNNING, locked_by=token
+        ).order_by('-priority', 'run_at', 'id'))
+
+    def lock(self, candidates, token):
+        job_ids = list(
+            candidates.values_list('pk', flat=True)[:self.batch_size]
+        )
+        if job_ids:
+            Job.objects.filter(pk__in=job_ids, status=Job.PENDING).update(
+                status=Job.RUNNING, locked_by=token, locked_at=timezone.now()
+            )
+
+    def execute(self, job):
+        registered = tasks.get(job.name)
+        try:
+            if registered is None:
+                raise LookupError(f'Задача {job.name} не зарегистрирована.')
+            registered.function(**job.payload)
+        except Exception:
+            logger.exception('Задача %s упала', job)
+            self.fail(job, traceback.format_exc())
+        else:
+            job.delete()
+
+    def fail(self, job, error):
+        job.attempts += 1
+        job.last_error = error
+        job.locked_by = ''
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts)
+            )
+        job.save(update_fields=(
+            'attempts', 'last_error', 'locked_by', 'locked_at', 'status',
+            'run_at',
+        ))
+
+    def requeue_stale(self):
+        """Возвращает в очередь задачи, брошенные упавшими обработчиками."""
+        return Job.objects.filter(
+            status=Job.RUNNING,
+            locked_at__lt=timezone.now() - timedelta(seconds=LOCK_TIMEOUT),
+        ).update(status=Job.PENDING, locked_by='', locked_at=None)